@@ -0,0 +1,288 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from concurrency import cpu_executor, get_http_client, run_blocking
+
+# Shared Alpha Vantage client. Responses are cached on disk so restarts don't spend
+# quota again, calls are paced by a token bucket, and concurrent requests for the
+# same data are merged into one upstream call.
+load_dotenv()
+API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
+BASE_URL = os.getenv("ALPHA_VANTAGE_URL", "https://www.alphavantage.co/query")
+TIMEOUT = float(os.getenv("ALPHA_VANTAGE_TIMEOUT", 15))
+
+CACHE_FILE = os.getenv("ALPHA_VANTAGE_CACHE_FILE", "data/alpha_vantage_cache.db")
+OVERVIEW_TTL = float(os.getenv("ALPHA_VANTAGE_OVERVIEW_TTL", 24 * 3600))
+NEWS_TTL = float(os.getenv("ALPHA_VANTAGE_NEWS_TTL", 3600))
+
+# Quota: a token bucket for the per-minute rate plus a persistent per-day call count
+CALLS_PER_MINUTE = float(os.getenv("ALPHA_VANTAGE_CALLS_PER_MINUTE", 5))
+CALLS_PER_DAY = int(os.getenv("ALPHA_VANTAGE_CALLS_PER_DAY", 25))
+# Longest a call queues for a token before it is refused
+MAX_WAIT = float(os.getenv("ALPHA_VANTAGE_MAX_WAIT", 30))
+
+_session = None
+_conn = None
+_lock = threading.Lock()
+# Cache key -> Future of the upstream call in flight, shared by every caller asking for it
+_inflight = {}
+_bucket = {"tokens": CALLS_PER_MINUTE, "updated": time.monotonic()}
+_stats = {"hits": 0, "misses": 0, "merged": 0, "calls": 0, "stale": 0, "refused": 0}
+
+
+def _get_session() -> requests.Session:
+    """Returns a shared session so connections to Alpha Vantage are reused. Caller holds _lock."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Opens the response cache on first use. Caller holds _lock."""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(CACHE_FILE) or ".", exist_ok=True)
+        _conn = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS quota (
+                day TEXT PRIMARY KEY,
+                calls INTEGER NOT NULL
+            );
+        """)
+    return _conn
+
+
+def cache_key(params: dict) -> str:
+    """Identifies a request by endpoint and parameters, without the API key."""
+    return json.dumps([BASE_URL, {k: v for k, v in sorted(params.items()) if k != "apikey"}])
+
+
+def _quota_day() -> str:
+    """Quota row of today's calls; counted per endpoint so a local fake server doesn't spend the real quota."""
+    return f"{time.strftime('%Y-%m-%d', time.gmtime())} {BASE_URL}"
+
+
+def is_valid(data: dict) -> bool:
+    """Whether a response carries data; rate-limit notes and error messages are never cached."""
+    return not any(key in data for key in ("Information", "Note", "Error Message", "error"))
+
+
+def _cached(key: str):
+    """Returns (body, age in seconds) of a cached response, or None. Caller holds _lock."""
+    row = _get_conn().execute("SELECT body, fetched_at FROM responses WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    return json.loads(row[0]), time.time() - row[1]
+
+
+def _store(key: str, data: dict):
+    """Caller holds _lock."""
+    conn = _get_conn()
+    conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, json.dumps(data), time.time()))
+    conn.commit()
+
+
+def _reserve() -> float:
+    """
+    Takes one call from the quota and returns how long the caller must wait before making it,
+    or None if the daily quota is spent or the queue for a token is longer than MAX_WAIT.
+    Reservations are handed out in order, so waiting callers form a queue. Caller holds _lock.
+    """
+    conn = _get_conn()
+    day = _quota_day()
+    row = conn.execute("SELECT calls FROM quota WHERE day = ?", (day,)).fetchone()
+    if row is not None and row[0] >= CALLS_PER_DAY:
+        return None
+
+    now = time.monotonic()
+    rate = CALLS_PER_MINUTE / 60
+    tokens = min(CALLS_PER_MINUTE, _bucket["tokens"] + (now - _bucket["updated"]) * rate)
+    wait = max(0.0, (1 - tokens) / rate)
+    if wait > MAX_WAIT:
+        return None
+
+    _bucket["tokens"] = tokens - 1  # Negative while callers are queued for future tokens
+    _bucket["updated"] = now
+    conn.execute(
+        "INSERT INTO quota VALUES (?, 1) ON CONFLICT(day) DO UPDATE SET calls = calls + 1", (day,)
+    )
+    conn.commit()
+    return wait
+
+
+def _begin(params: dict, ttl: float):
+    """
+    Looks up the cache and the calls in flight. Returns (data, None, None) for a cached answer,
+    (None, future, None) to wait on another caller's call, or (None, future, wait) when this
+    caller must make the call itself after sleeping `wait` seconds and resolve `future`.
+    """
+    key = cache_key(params)
+    with _lock:
+        cached = _cached(key)
+        if cached is not None and cached[1] < ttl:
+            _stats["hits"] += 1
+            return cached[0], None, None
+        if key in _inflight:
+            _stats["merged"] += 1
+            return None, _inflight[key], None
+
+        _stats["misses"] += 1
+        wait = _reserve()
+        if wait is None:
+            # Out of quota: an expired answer beats none
+            _stats["refused"] += 1
+            if cached is not None:
+                _stats["stale"] += 1
+                return cached[0], None, None
+            return {"error": "Alpha Vantage API quota reached, try again later"}, None, None
+
+        future = Future()
+        _inflight[key] = future
+        _stats["calls"] += 1
+        return None, future, wait
+
+
+def _finish(params: dict, future: Future, data: dict) -> dict:
+    """Caches a good response, falls back to a stale one otherwise, and wakes merged callers."""
+    key = cache_key(params)
+    with _lock:
+        if is_valid(data):
+            _store(key, data)
+        else:
+            cached = _cached(key)
+            if cached is not None:
+                _stats["stale"] += 1
+                data = cached[0]
+        _inflight.pop(key, None)
+    future.set_result(data)
+    return data
+
+
+def _abort(params: dict, future: Future):
+    """Releases callers merged into a call that was cancelled before it finished."""
+    with _lock:
+        _inflight.pop(cache_key(params), None)
+    future.set_result({"error": "Alpha Vantage request was cancelled"})
+
+
+def query(params: dict, ttl: float) -> dict:
+    """Calls the Alpha Vantage query endpoint, answering from the cache while it is younger than `ttl`."""
+    data, future, wait = _begin(params, ttl)
+    if data is not None:
+        return data
+    if wait is None:
+        return future.result()
+
+    try:
+        time.sleep(wait)
+        with _lock:
+            session = _get_session()
+        response = session.get(BASE_URL, params={**params, "apikey": API_KEY}, timeout=TIMEOUT)
+        data = response.json() if response.status_code == 200 else {"error": "Failed to fetch data"}
+    except (requests.RequestException, ValueError) as e:
+        data = {"error": f"Failed to fetch data: {e}"}
+    except BaseException:
+        _abort(params, future)
+        raise
+    return _finish(params, future, data)
+
+
+async def query_async(params: dict, ttl: float) -> dict:
+    """
+    Like query, but waits and calls over the shared async HTTP client.
+    Cache and quota reads and writes run in cpu_executor, off the event loop.
+    """
+    def abandon(begin):
+        # Cancelled while _begin ran: release callers merged into the call it registered
+        if not begin.cancelled() and begin.exception() is None:
+            _, future, wait = begin.result()
+            if wait is not None:
+                _abort(params, future)
+
+    begin = asyncio.ensure_future(run_blocking(cpu_executor, _begin, params, ttl))
+    try:
+        data, future, wait = await asyncio.shield(begin)
+    except asyncio.CancelledError:
+        begin.add_done_callback(abandon)
+        raise
+    if data is not None:
+        return data
+    if wait is None:
+        return await asyncio.wrap_future(future)
+
+    try:
+        await asyncio.sleep(wait)
+        response = await get_http_client().get(BASE_URL, params={**params, "apikey": API_KEY}, timeout=TIMEOUT)
+        data = response.json() if response.status_code == 200 else {"error": "Failed to fetch data"}
+    except (httpx.HTTPError, ValueError) as e:
+        data = {"error": f"Failed to fetch data: {e}"}
+    except BaseException:
+        _abort(params, future)  # Also on cancellation of the awaiting request
+        raise
+    return await run_blocking(cpu_executor, _finish, params, future, data)
+
+
+def news_params(ticker: str, sort: str = "RELEVANCE", topics: str = None) -> dict:
+    """Query parameters for the NEWS_SENTIMENT endpoint."""
+    params = {"function": "NEWS_SENTIMENT", "tickers": ticker.upper(), "sort": sort}
+    if topics:
+        params["topics"] = topics
+    return params
+
+
+def overview_params(ticker: str) -> dict:
+    """Query parameters for the OVERVIEW endpoint."""
+    return {"function": "OVERVIEW", "symbol": ticker.upper()}
+
+
+def get_news(ticker: str, sort: str = "RELEVANCE", topics: str = None) -> dict:
+    """Returns the raw NEWS_SENTIMENT response for `ticker`."""
+    return query(news_params(ticker, sort, topics), NEWS_TTL)
+
+
+async def get_news_async(ticker: str, sort: str = "RELEVANCE", topics: str = None) -> dict:
+    return await query_async(news_params(ticker, sort, topics), NEWS_TTL)
+
+
+def get_overview(ticker: str) -> dict:
+    """Returns the raw OVERVIEW response for `ticker`."""
+    return query(overview_params(ticker), OVERVIEW_TTL)
+
+
+async def get_overview_async(ticker: str) -> dict:
+    return await query_async(overview_params(ticker), OVERVIEW_TTL)
+
+
+def remaining_calls() -> int:
+    """Calls left in today's quota."""
+    with _lock:
+        row = _get_conn().execute("SELECT calls FROM quota WHERE day = ?", (_quota_day(),)).fetchone()
+    return max(CALLS_PER_DAY - (row[0] if row else 0), 0)
+
+
+def client_stats() -> dict:
+    """Returns cache hits, merged and upstream calls, and today's quota use."""
+    day = _quota_day()
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute("SELECT calls FROM quota WHERE day = ?", (day,)).fetchone()
+        cached = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    return dict(_stats, cached_responses=cached, calls_today=row[0] if row else 0, calls_per_day=CALLS_PER_DAY)
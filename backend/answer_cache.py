@@ -0,0 +1,127 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import embeddings
+import symbols
+from lexical_index import tokenize
+
+# Cache of LLM answers per (ticker, index version). A question hits when its normalized text
+# matches a cached one, or when its embedding is at least SIMILARITY_THRESHOLD (cosine) close.
+# A new index version starts with an empty cache, since its news may change the answer.
+# Questions that differ only in a number or a ticker ("Q3" vs "Q4", "2023" vs "2024") embed
+# almost identically, so a semantic hit also needs the same numbers and tickers.
+TTL = float(os.getenv("ANSWER_CACHE_TTL", 3600))
+SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.97))
+MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 256))  # Per ticker and version
+# Across all keys; cross-ticker and filtered questions each get their own key, so bound them together
+MAX_TOTAL_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_TOTAL_ENTRIES", 4096))
+
+# (ticker, version) -> OrderedDict of normalized question -> entry; both levels least recently used first
+_entries = OrderedDict()
+_lock = threading.Lock()
+_stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+
+def key_tokens(question: str) -> frozenset:
+    """
+    The tokens of `question` a semantic hit must share: numbers and periods ("4.05", "2024",
+    "q3") and tickers written in capitals ("AAPL"), checked against the listing when there is one.
+    """
+    capitals = set(re.findall(r"\b[A-Z]{1,5}\b", question))
+    return frozenset(
+        token for token in tokenize(question)
+        if any(c.isdigit() for c in token)
+        or (token.upper() in capitals and (not symbols.available() or symbols.is_valid(token)))
+    )
+
+
+def lookup(ticker: str, version: str, question: str):
+    """
+    Returns the cached answer to `question` on this index version, or None.
+    Encodes the question (through the query cache) when there is no exact match, so call it off the event loop.
+    """
+    key = embeddings.normalize_query(question)
+    tokens = key_tokens(question)
+    now = time.time()
+    with _lock:
+        entries = _entries.get((ticker, version))
+        if entries is None:
+            _stats["misses"] += 1
+            return None
+        for stale in [k for k, entry in entries.items() if now - entry["created_at"] > TTL]:
+            del entries[stale]
+
+        _entries.move_to_end((ticker, version))
+        entry = entries.get(key)
+        if entry is not None:
+            entries.move_to_end(key)
+            _stats["exact_hits"] += 1
+            _stats["saved_seconds"] += entry["seconds"]
+            return entry["answer"]
+        keys = [k for k, entry in entries.items() if entry["tokens"] == tokens]
+        if not keys:
+            _stats["misses"] += 1
+            return None
+        vectors = np.vstack([entries[k]["vector"] for k in keys])
+
+    # Vectors are L2-normalized, so the inner product is the cosine similarity
+    scores = vectors @ embeddings.encode_query(question)[0]
+    best = int(np.argmax(scores))
+    with _lock:
+        entries = _entries.get((ticker, version), {})
+        entry = entries.get(keys[best])
+        if scores[best] < SIMILARITY_THRESHOLD or entry is None:
+            _stats["misses"] += 1
+            return None
+        entries.move_to_end(keys[best])
+        _stats["semantic_hits"] += 1
+        _stats["saved_seconds"] += entry["seconds"]
+        return entry["answer"]
+
+
+def put(ticker: str, version: str, question: str, answer: str, seconds: float):
+    """
+    Caches the answer to `question` on this index version, along with the `seconds` it took to produce.
+    Answers for older versions of the ticker's index and expired answers are dropped, and beyond
+    MAX_TOTAL_ENTRIES the least recently used answers of the least recently used keys go first.
+    """
+    key = embeddings.normalize_query(question)
+    vector = embeddings.encode_query(question)[0]
+    tokens = key_tokens(question)
+    now = time.time()
+    with _lock:
+        for old in [k for k in _entries if k[0] == ticker and k[1] != version]:
+            del _entries[old]
+        entries = _entries.setdefault((ticker, version), OrderedDict())
+        entries[key] = {"answer": answer, "vector": vector, "tokens": tokens, "seconds": seconds, "created_at": now}
+        entries.move_to_end(key)
+        _entries.move_to_end((ticker, version))
+        while len(entries) > MAX_ENTRIES:
+            entries.popitem(last=False)
+
+        total = 0
+        for scope, scoped in list(_entries.items()):
+            for stale in [k for k, entry in scoped.items() if now - entry["created_at"] > TTL]:
+                del scoped[stale]
+            if not scoped:
+                del _entries[scope]
+            total += len(scoped)
+        while total > MAX_TOTAL_ENTRIES:
+            scope, scoped = next(iter(_entries.items()))
+            scoped.popitem(last=False)
+            total -= 1
+            if not scoped:
+                del _entries[scope]
+
+
+def cache_stats() -> dict:
+    """Returns hit counts, the hit rate and the LLM time saved by answering from the cache."""
+    with _lock:
+        stats = dict(_stats, entries=sum(len(entries) for entries in _entries.values()))
+    lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["exact_hits"] + stats["semantic_hits"]) / lookups, 3) if lookups else 0
+    stats["saved_seconds"] = round(stats["saved_seconds"], 2)
+    return stats
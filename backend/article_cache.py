@@ -0,0 +1,139 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# Persistent cache of parsed articles, their chunk boundaries and chunk embeddings.
+# Articles are stored once per content hash; URLs point at the content they resolved to,
+# so the same story seen under another ticker, another day or another URL is reused.
+CACHE_FILE = os.getenv("ARTICLE_CACHE_FILE", "data/article_cache.db")
+MAX_BYTES = int(os.getenv("ARTICLE_CACHE_MAX_BYTES", 1024 * 2**20))
+
+_conn = None
+_lock = threading.Lock()
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Opens the cache database on first use. Caller holds _lock."""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(CACHE_FILE) or ".", exist_ok=True)
+        _conn = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript("""
+            CREATE TABLE IF NOT EXISTS articles (
+                content_hash TEXT NOT NULL,
+                embed_key TEXT NOT NULL,
+                text TEXT NOT NULL,
+                offsets BLOB NOT NULL,
+                vectors BLOB NOT NULL,
+                dim INTEGER NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (content_hash, embed_key)
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS articles_last_used ON articles (last_used);
+        """)
+    return _conn
+
+
+def content_hash(text: str) -> str:
+    """Returns the content address of an article's parsed text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _row_to_entry(row) -> dict:
+    text, offsets, vectors, dim = row
+    return {
+        "text": text,
+        "offsets": np.frombuffer(offsets, dtype=np.int64).reshape(-1, 2),
+        "vectors": np.frombuffer(vectors, dtype=np.float32).reshape(-1, dim).copy(),
+    }
+
+
+def get(digest: str, embed_key: str):
+    """Returns the cached entry for a content hash, or None on a miss."""
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute(
+            "SELECT text, offsets, vectors, dim FROM articles WHERE content_hash = ? AND embed_key = ?",
+            (digest, embed_key),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE articles SET last_used = ? WHERE content_hash = ? AND embed_key = ?",
+            (time.time(), digest, embed_key),
+        )
+        conn.commit()
+    return _row_to_entry(row)
+
+
+def get_by_url(url: str, embed_key: str):
+    """Returns the cached entry an article URL resolved to, or None if the URL was never processed."""
+    with _lock:
+        row = _get_conn().execute("SELECT content_hash FROM urls WHERE url = ?", (url,)).fetchone()
+    if row is None:
+        return None
+    return get(row[0], embed_key)
+
+
+def put(url: str, text: str, offsets, vectors, embed_key: str) -> str:
+    """
+    Stores an article's text, chunk (start, end) offsets and chunk vectors under its content hash,
+    points `url` at it and evicts least recently used articles beyond the size limit.
+    """
+    digest = content_hash(text)
+    offsets = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    size_bytes = len(text.encode("utf-8")) + offsets.nbytes + vectors.nbytes
+
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (digest, embed_key, text, offsets.tobytes(), vectors.tobytes(),
+             vectors.shape[1], size_bytes, time.time()),
+        )
+        conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, digest))
+        _evict(conn)
+        conn.commit()
+    return digest
+
+
+def link_url(url: str, digest: str):
+    """Points `url` at already cached content, e.g. a syndicated copy of a known story."""
+    with _lock:
+        conn = _get_conn()
+        conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, digest))
+        conn.commit()
+
+
+def _evict(conn: sqlite3.Connection):
+    """Deletes least recently used articles until the cache fits MAX_BYTES. Caller holds _lock."""
+    total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM articles").fetchone()[0]
+    if total <= MAX_BYTES:
+        return
+
+    rows = conn.execute("SELECT content_hash, embed_key, size_bytes FROM articles ORDER BY last_used").fetchall()
+    for digest, embed_key, size_bytes in rows:
+        if total <= MAX_BYTES:
+            break
+        conn.execute("DELETE FROM articles WHERE content_hash = ? AND embed_key = ?", (digest, embed_key))
+        total -= size_bytes
+    conn.execute("DELETE FROM urls WHERE content_hash NOT IN (SELECT content_hash FROM articles)")
+
+
+def cache_stats() -> dict:
+    """Returns the number of cached articles and URLs and the bytes they use."""
+    with _lock:
+        conn = _get_conn()
+        articles, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM articles").fetchone()
+        urls = conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+    return {"articles": articles, "urls": urls, "bytes": size, "max_bytes": MAX_BYTES}
@@ -0,0 +1,143 @@
+import contextvars
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, ProcessPoolExecutor, wait
+from itertools import islice
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.documents import Document
+from html_extract import extract_text
+import metrics
+
+# Download / extraction limits, overridable from the environment
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", 16))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", 10))
+PER_HOST_CONNECTIONS = int(os.getenv("FETCH_PER_HOST_CONNECTIONS", 4))
+# Each parse worker is a separate interpreter, so keep the default small
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", min(2, os.cpu_count() or 1)))
+# Articles downloading, extracting or waiting for the splitter at once; bounds pages held in memory
+PIPELINE_WINDOW = int(os.getenv("PIPELINE_WINDOW", 32))
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+    )
+}
+
+_session = None
+_init_lock = threading.Lock()
+_host_semaphores = {}
+_host_lock = threading.Lock()
+_parse_pool = None
+
+
+def _get_session() -> requests.Session:
+    """Returns a shared session so connections to the same news site are reused."""
+    global _session
+    with _init_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=PER_HOST_CONNECTIONS)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers.update(HEADERS)
+        return _session
+
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    """Returns the semaphore limiting open connections to the host of `url`."""
+    host = urlparse(url).netloc
+    with _host_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(PER_HOST_CONNECTIONS)
+        return _host_semaphores[host]
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """Returns the process pool used for CPU-bound HTML extraction."""
+    global _parse_pool
+    with _init_lock:
+        if _parse_pool is None:
+            # Spawned, not forked: forking a process that already runs threads (and has torch
+            # loaded) can copy a lock held by another thread and deadlock the worker.
+            # A spawned worker re-runs the main script outside its __main__ guard, so start the
+            # server with `uvicorn server:app`; `python server.py` would load the ML stack in every worker
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _parse_pool
+
+
+def download(url: str) -> str:
+    """
+    Downloads the HTML of `url`, waiting for a free connection slot to its host.
+    Raises on timeouts, HTTP errors and non-HTML responses.
+    """
+    with _host_semaphore(url):
+        response = _get_session().get(url, timeout=FETCH_TIMEOUT)
+    response.raise_for_status()
+
+    content_type = response.headers.get("Content-Type", "")
+    if "html" not in content_type:
+        raise ValueError(f"Unsupported content type: {content_type or 'unknown'}")
+    return response.text
+
+
+def _load_one(url: str, tally: dict = None) -> tuple:
+    """Downloads and extracts one article. Returns (url, Document or None, reason it was skipped)."""
+    try:
+        # Fetch stage: network bound, so threads
+        with metrics.timer("fetch", tally):
+            html = download(url)
+    except Exception as e:
+        return url, None, str(e)
+
+    try:
+        # Extract stage: CPU bound, so processes; this thread waits and its download slot is already free
+        with metrics.timer("parse", tally):
+            text = _get_parse_pool().submit(extract_text, html).result()
+    except Exception as e:
+        return url, None, f"Failed to parse: {e}"
+    if not text.strip():
+        return url, None, "No text extracted"
+    return url, Document(page_content=text, metadata={"source": url}), None
+
+
+def iter_articles(urls: list, tally: dict = None):
+    """
+    Yields (url, Document or None, reason it was skipped) for each of `urls` as soon as it is
+    downloaded and extracted, in completion order. At most PIPELINE_WINDOW articles are in
+    flight or waiting to be consumed, so a slow consumer holds back further downloads and
+    the pages in memory stay bounded while early articles are already split and embedded.
+    """
+    if not urls:
+        return
+    pending = iter(urls)
+    in_flight = set()
+    fetched = failed = 0
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, PIPELINE_WINDOW, len(urls))) as executor:
+        def submit(url):
+            # Stage times reach the build's trace in the worker threads too
+            in_flight.add(executor.submit(contextvars.copy_context().run, _load_one, url, tally))
+
+        for url in islice(pending, PIPELINE_WINDOW):
+            submit(url)
+        try:
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.discard(future)
+                    url, document, reason = future.result()
+                    fetched += document is not None
+                    failed += document is None
+                    yield url, document, reason
+                    # The consumer took one, so another may start
+                    for url in islice(pending, 1):
+                        submit(url)
+        finally:
+            for future in in_flight:
+                future.cancel()  # Consumer stopped early; don't start the rest
+            metrics.count("articles_fetched", fetched)
+            metrics.count("articles_failed", failed)
+
@@ -0,0 +1,96 @@
+"""
+Recall@k vs latency benchmark for the approximate index options against the
+exact flat baseline.
+
+Run from the backend folder:
+    python -m bench.ann_bench --vectors 200000 --queries 500 --k 10
+
+Vectors come from every published ticker index when --from-indexes is given
+(the multi-ticker archive case), otherwise from a synthetic clustered corpus
+with the embedding model's dimension.
+"""
+import argparse
+import time
+import faiss
+import numpy as np
+import index_factory
+import index_store
+
+
+def synthetic_corpus(n: int, dim: int, clusters: int = 256, seed: int = 0):
+    """Clustered, L2-normalized vectors; topical news embeddings are far from uniform."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def indexed_corpus():
+    """Reconstructs the vectors of every published flat ticker index."""
+    blocks = []
+    for ticker in index_store.list_tickers():
+        index, _, _ = index_store.load_version(ticker, index_store.current_version(ticker), mmap=False)
+        if index_factory.index_kind(index) == "flat" and isinstance(index, faiss.IndexIDMap2):
+            inner = faiss.downcast_index(index.index)
+            blocks.append(inner.reconstruct_n(0, inner.ntotal))
+    return np.vstack(blocks)
+
+
+def timed_search(index, queries, k):
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    return ids, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def recall(ids, truth, k):
+    return np.mean([len(set(a[:k]) & set(b[:k])) / k for a, b in zip(ids, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--from-indexes", action="store_true")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    corpus = indexed_corpus() if args.from_indexes else synthetic_corpus(args.vectors, args.dim)
+    rng = np.random.default_rng(1)
+    queries = corpus[rng.choice(len(corpus), args.queries, replace=False)].copy()
+    queries += 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+    ids = np.arange(len(corpus), dtype=np.int64)
+    print(f"{len(corpus)} vectors, dim {corpus.shape[1]}, {len(queries)} queries, k={args.k}\n")
+
+    results = []
+
+    flat = index_factory.make_index(corpus.shape[1], len(corpus), "flat")
+    flat.add_with_ids(corpus, ids)
+    truth, latency = timed_search(flat, queries, args.k)
+    results.append(("flat", "-", 1.0, latency, 0.0))
+
+    for kind, values, param in (("hnsw", args.ef_search, "efSearch"), ("ivfpq", args.nprobe, "nprobe")):
+        start = time.perf_counter()
+        index = index_factory.make_index(corpus.shape[1], len(corpus), kind)
+        index_factory.train(index, corpus)
+        index.add_with_ids(corpus, ids)
+        build_seconds = time.perf_counter() - start
+        for value in values:
+            if kind == "hnsw":
+                index_factory.set_search_params(index, ef_search=value)
+            else:
+                index_factory.set_search_params(index, nprobe=value)
+            found, latency = timed_search(index, queries, args.k)
+            results.append((kind, f"{param}={value}", recall(found, truth, args.k), latency, build_seconds))
+
+    print(f"{'index':<6} {'params':<13} {'recall@k':>9} {'ms/query':>9} {'build s':>8}")
+    for kind, params, rec, latency, build_seconds in results:
+        print(f"{kind:<6} {params:<13} {rec:>9.3f} {latency:>9.3f} {build_seconds:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
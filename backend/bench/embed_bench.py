@@ -0,0 +1,72 @@
+"""
+Embedding throughput benchmark: chunks per second for each combination of
+encoder process count and batch size, with and without length sorting.
+
+Run from the backend folder:
+    python -m bench.embed_bench --chunks 2000 --processes 1 2 4 --batch-sizes 16 32 64
+
+Texts are cached article chunks when data/article_cache.db has any, otherwise
+synthetic chunks with news-like length variation.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+import numpy as np
+import embeddings
+from model_registry import get_encoder
+
+
+def load_texts(n: int) -> list:
+    """Returns up to `n` chunk texts from the article cache, topped up with synthetic ones."""
+    texts = []
+    if os.path.exists("data/article_cache.db"):
+        conn = sqlite3.connect("data/article_cache.db")
+        for text, offsets in conn.execute("SELECT text, offsets FROM articles"):
+            for start, end in np.frombuffer(offsets, dtype=np.int64).reshape(-1, 2):
+                texts.append(text[start:end])
+        conn.close()
+
+    rng = random.Random(0)
+    words = "revenue earnings guidance quarter margin shares analyst growth outlook dividend".split()
+    while len(texts) < n:
+        texts.append(" ".join(rng.choice(words) for _ in range(rng.randint(20, 180))))
+    return texts[:n]
+
+
+def time_encode(texts, batch_size, processes, sort):
+    start = time.perf_counter()
+    if sort:
+        for _ in embeddings.encode_batches(texts, batch_size, processes):
+            pass
+    else:
+        get_encoder().encode(texts, batch_size=batch_size)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 32, 64])
+    args = parser.parse_args()
+
+    texts = load_texts(args.chunks)
+    get_encoder().encode(["warm up"])
+    print(f"{len(texts)} chunks, {os.cpu_count()} cores\n")
+
+    print(f"{'processes':>9} {'batch':>6} {'sorted':>7} {'chunks/s':>9}")
+    for batch_size in args.batch_sizes:
+        rate = time_encode(texts, batch_size, 1, sort=False)
+        print(f"{1:>9} {batch_size:>6} {'no':>7} {rate:>9.1f}")
+    for processes in args.processes:
+        for batch_size in args.batch_sizes:
+            rate = time_encode(texts, batch_size, processes, sort=True)
+            print(f"{processes:>9} {batch_size:>6} {'yes':>7} {rate:>9.1f}")
+
+    embeddings.stop_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Retrieval quality of dense, BM25 and hybrid (reciprocal rank fusion) search on a
+small labeled set of finance news chunks, plus BM25 lookup latency.
+
+Run from the backend folder:
+    python -m bench.hybrid_bench --k 3
+
+The corpus repeats the same story for several companies, quarters and years, so
+only the exact tokens (ticker, "Q3", "2024", the figure) tell the chunks apart;
+a few paraphrased questions check that fusion keeps dense search's strengths.
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+import embeddings
+import index_factory
+import lexical_index
+import retrieval
+
+COMPANIES = [("Apple", "AAPL"), ("Microsoft", "MSFT"), ("Nvidia", "NVDA"), ("Amazon", "AMZN")]
+PERIODS = [("Q2", 2024), ("Q3", 2024), ("Q3", 2023), ("Q4", 2023)]
+
+PARAPHRASED = [
+    ("Tesla warned that a shortage of battery cells would cap vehicle deliveries next quarter.",
+     "Is Tesla expecting supply problems to limit how many cars it ships?"),
+    ("Regulators in the EU opened an antitrust probe into Alphabet's advertising technology business.",
+     "Are European authorities investigating Google over competition concerns?"),
+    ("Meta plans to spend heavily on data centers to train larger AI models, lifting capital expenditure guidance.",
+     "Will Meta's investment in AI infrastructure increase its spending?"),
+]
+
+
+def labeled_corpus():
+    """Returns (chunks, questions) where each question is (text, id of its relevant chunk)."""
+    chunks, questions = [], []
+    for c, (name, ticker) in enumerate(COMPANIES):
+        for p, (quarter, year) in enumerate(PERIODS):
+            eps = 1.0 + 0.37 * c + 0.11 * p
+            revenue = 20 + 13 * c + 4 * p
+            chunks.append({
+                "text": (f"{name} ({ticker}) reported {quarter} {year} results: EPS of ${eps:.2f} on revenue of "
+                         f"${revenue}.{p}B. Management said demand stayed resilient and guided to steady margins."),
+                "source": f"https://example.com/{ticker}/{quarter}-{year}",
+                "published": f"{year}0101T000000",
+            })
+            questions.append((f"What was {ticker} {quarter} {year} EPS?", len(chunks) - 1))
+    for text, question in PARAPHRASED:
+        chunks.append({"text": text, "source": "https://example.com/other", "published": "20240101T000000"})
+        questions.append((question, len(chunks) - 1))
+    return chunks, questions
+
+
+def evaluate(rank, questions, k):
+    """Returns recall@k and mean reciprocal rank of the labeled chunk."""
+    hits, reciprocal = 0, 0.0
+    for question, relevant in questions:
+        ids = rank(question)[:k]
+        if relevant in ids:
+            hits += 1
+            reciprocal += 1 / (ids.index(relevant) + 1)
+    return hits / len(questions), reciprocal / len(questions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+
+    chunks, questions = labeled_corpus()
+    vectors = embeddings.encode([chunk["text"] for chunk in chunks])
+    index = index_factory.make_index(vectors.shape[1], len(vectors), "flat")
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+
+    with tempfile.TemporaryDirectory() as path:
+        lexical_index.write(path, chunks)
+        lexical = lexical_index.LexicalIndex(path)
+
+    depth = max(args.k, retrieval.CANDIDATES)
+    rankers = {
+        "dense": lambda q: retrieval.dense_search(index, q, depth),
+        "bm25": lambda q: lexical.search(q, depth)[0].tolist(),
+        "hybrid": lambda q: retrieval.search(index, lexical, q, depth),
+    }
+
+    print(f"{len(chunks)} chunks, {len(questions)} labeled questions, k={args.k}\n")
+    print(f"{'search':<7} {'recall@k':>9} {'MRR':>6}")
+    for name, rank in rankers.items():
+        rec, mrr = evaluate(rank, questions, args.k)
+        print(f"{name:<7} {rec:>9.3f} {mrr:>6.3f}")
+
+    start = time.perf_counter()
+    for i in range(args.lookups):
+        lexical.search(questions[i % len(questions)][0], args.k)
+    print(f"\nBM25 lookup: {(time.perf_counter() - start) / args.lookups * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Load test for the /ask/ endpoint: sends questions at increasing concurrency and
+reports throughput, time-to-first-byte and total latency at each level.
+
+Start the stub upstreams and a server that uses them, then run:
+    python -m bench.stub_upstreams --port 9000 &
+    ALPHA_VANTAGE_URL=http://localhost:9000/query OPEN_ROUTER_BASE_URL=http://localhost:9000/v1 uvicorn server:app &
+    python -m bench.load_test --ticker AAPL --levels 1 2 4 8 16
+
+/build-index/ only queues a build job, so the load test first builds the ticker's index
+and polls /build-status/{job_id} until the job is done. Pass --no-build to skip that.
+
+With a non-blocking server, throughput grows with concurrency until the CPU
+executor saturates, instead of staying flat at one request at a time.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+QUESTIONS = [
+    "What were the latest earnings?",
+    "What are the main risks?",
+    "Summarize recent news.",
+    "How is revenue trending?",
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def build_index(base_url, ticker, poll_seconds=0.5):
+    """Queues a build of `ticker`'s index and waits for the job to finish. Returns the finished job."""
+    async with httpx.AsyncClient(timeout=30) as client:
+        response = await client.get(f"{base_url}/build-index/", params={"ticker": ticker})
+        job = response.json()
+        if "job_id" not in job:
+            raise RuntimeError(f"Build of {ticker} was rejected: {job.get('error', job)}")
+        while job["status"] not in ("done", "failed"):
+            await asyncio.sleep(poll_seconds)
+            status = (await client.get(f"{base_url}/build-status/{job['job_id']}")).json()
+            if "status" not in status:  # Pruned, or the server restarted
+                raise RuntimeError(f"Lost the build job of {ticker}: {status.get('error', status)}")
+            job = status
+    if job["status"] == "failed":
+        raise RuntimeError(f"Build of {ticker} failed: {job['result']['error']}")
+    return job
+
+
+async def ask(client, base_url, ticker, question):
+    """Streams one answer and returns (time to first byte, total latency) in seconds."""
+    start = time.perf_counter()
+    first_byte = None
+    async with client.stream("GET", f"{base_url}/ask/", params={"ticker": ticker, "question": question}) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+    return first_byte or 0.0, time.perf_counter() - start
+
+
+async def run_level(base_url, ticker, concurrency, requests_per_user):
+    """Runs `concurrency` users each sending `requests_per_user` questions back to back."""
+    ttfbs, latencies = [], []
+
+    async def user(client, user_id):
+        for i in range(requests_per_user):
+            ttfb, latency = await ask(client, base_url, ticker, QUESTIONS[(user_id + i) % len(QUESTIONS)])
+            ttfbs.append(ttfb)
+            latencies.append(latency)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(user(client, u) for u in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "ttfb_p50": statistics.median(ttfbs),
+        "latency_p50": statistics.median(latencies),
+        "latency_p99": percentile(latencies, 99),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--ticker", default="AAPL")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests-per-user", type=int, default=5)
+    parser.add_argument("--no-build", action="store_true", help="Use the ticker's existing index instead of building it first")
+    args = parser.parse_args()
+
+    if not args.no_build:
+        job = await build_index(args.url, args.ticker)
+        print(f"Built {args.ticker}: {job['result']['message']}")
+
+    print(f"{'users':>5} {'reqs':>5} {'req/s':>8} {'ttfb p50':>9} {'lat p50':>8} {'lat p99':>8}")
+    baseline = None
+    for level in args.levels:
+        result = await run_level(args.url, args.ticker, level, args.requests_per_user)
+        baseline = baseline or result["throughput"]
+        print(f"{result['concurrency']:>5} {result['requests']:>5} {result['throughput']:>8.2f} "
+              f"{result['ttfb_p50']:>8.3f}s {result['latency_p50']:>7.3f}s {result['latency_p99']:>7.3f}s "
+              f"(x{result['throughput'] / baseline:.1f})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
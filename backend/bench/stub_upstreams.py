@@ -0,0 +1,154 @@
+"""
+Local stand-ins for Alpha Vantage, the news sites and OpenRouter, so the server
+can be load-tested and benchmarked without network access or API quota.
+
+Run from the backend folder:
+    python -m bench.stub_upstreams --port 9000
+
+and point the server at it:
+    ALPHA_VANTAGE_URL=http://localhost:9000/query
+    OPEN_ROUTER_BASE_URL=http://localhost:9000/v1
+
+The Alpha Vantage client paces and counts calls to the stub like the real API;
+raise ALPHA_VANTAGE_CALLS_PER_MINUTE / ALPHA_VANTAGE_CALLS_PER_DAY for load tests.
+
+With --fixtures DIR (see bench/fixtures), recorded Alpha Vantage responses and saved
+article pages are replayed instead of the synthetic ones, for tickers that have them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from urllib.parse import quote
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, StreamingResponse
+
+# Simulated upstream latencies (seconds)
+LLM_TTFT = float(os.getenv("STUB_LLM_TTFT", 0.3))
+LLM_TOKEN_DELAY = float(os.getenv("STUB_LLM_TOKEN_DELAY", 0.01))
+LLM_TOKENS = int(os.getenv("STUB_LLM_TOKENS", 50))
+NUM_ARTICLES = int(os.getenv("STUB_NUM_ARTICLES", 20))
+ALPHA_VANTAGE_DELAY = float(os.getenv("STUB_ALPHA_VANTAGE_DELAY", 0))
+# Recorded responses and article pages to replay, laid out as bench/fixtures
+FIXTURES_DIR = os.getenv("STUB_FIXTURES")
+
+app = FastAPI()
+stub_base_url = "http://localhost:9000"
+# Upstream calls received per Alpha Vantage function, to check client-side caching and merging
+av_calls = {}
+
+
+@app.get("/query")
+async def alpha_vantage(function: str, symbol: str = None, tickers: str = None, apikey: str = None):
+    """Fake Alpha Vantage query endpoint supporting OVERVIEW and NEWS_SENTIMENT."""
+    av_calls[function] = av_calls.get(function, 0) + 1
+    await asyncio.sleep(ALPHA_VANTAGE_DELAY)
+    recorded = load_recorded(function, symbol or tickers)
+    if recorded is not None:
+        return JSONResponse(content=recorded)
+    if function == "OVERVIEW":
+        return JSONResponse(content={
+            "Symbol": symbol,
+            "Name": f"{symbol} Inc",
+            "Sector": "TECHNOLOGY",
+            "MarketCapitalization": "1000000000",
+            "PERatio": "25.0",
+            "Description": f"{symbol} makes things.",
+        })
+    if function == "NEWS_SENTIMENT":
+        now = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        feed = [
+            {
+                "title": f"{tickers} story {i}",
+                "url": f"{stub_base_url}/articles/{tickers}/{i}",
+                "time_published": now,
+                "summary": f"Summary of {tickers} story {i}.",
+            }
+            for i in range(NUM_ARTICLES)
+        ]
+        return JSONResponse(content={"items": str(len(feed)), "feed": feed})
+    return JSONResponse(content={"Information": f"Unsupported function {function}"})
+
+
+def load_recorded(function: str, key: str):
+    """
+    Returns the recorded response for this function and ticker, or None. Feed article URLs are
+    pointed at the saved pages; each keeps its original URL so syndicated copies stay distinct.
+    """
+    path = os.path.join(FIXTURES_DIR or "", "alpha_vantage", f"{function}-{key}.json")
+    if not FIXTURES_DIR or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    if "feed" in data:
+        with open(os.path.join(FIXTURES_DIR, "articles", "urls.json")) as f:
+            pages = json.load(f)
+        data["feed"] = [
+            dict(item, url=f"{stub_base_url}/fixtures/articles/{pages[item['url']]}?url={quote(item['url'], safe='')}")
+            for item in data["feed"] if item["url"] in pages
+        ]
+    return data
+
+
+@app.get("/fixtures/articles/{name}")
+async def saved_article(name: str):
+    """Saved news article page."""
+    path = os.path.join(FIXTURES_DIR or "", "articles", os.path.basename(name))
+    if not FIXTURES_DIR or not os.path.exists(path):
+        return HTMLResponse("Not found", status_code=404)
+    return FileResponse(path, media_type="text/html")
+
+
+@app.get("/stub-stats")
+async def stub_stats():
+    """Alpha Vantage calls received so far."""
+    return JSONResponse(content={"alpha_vantage_calls": av_calls})
+
+
+@app.get("/articles/{ticker}/{i}")
+async def article(ticker: str, i: int):
+    """Fake news article page."""
+    paragraphs = "".join(
+        f"<p>{ticker} reported quarter {q} results. Revenue grew {i + q} percent and EPS beat estimates.</p>"
+        for q in range(1, 40)
+    )
+    return HTMLResponse(f"<html><body><h1>{ticker} story {i}</h1>{paragraphs}</body></html>")
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """Fake OpenAI-compatible completion endpoint; streams LLM_TOKENS tokens after LLM_TTFT."""
+    body = await request.json()
+
+    async def events():
+        await asyncio.sleep(LLM_TTFT)
+        for i in range(LLM_TOKENS):
+            chunk = {
+                "id": "stub", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": f"token{i} "}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(LLM_TOKEN_DELAY)
+        yield "data: [DONE]\n\n"
+
+    if body.get("stream"):
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(LLM_TTFT + LLM_TOKEN_DELAY * LLM_TOKENS)
+    return JSONResponse(content={
+        "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": " ".join(f"token{i}" for i in range(LLM_TOKENS))}}],
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--fixtures", help="Folder of recorded responses and saved pages to replay")
+    args = parser.parse_args()
+    stub_base_url = f"http://localhost:{args.port}"
+    FIXTURES_DIR = args.fixtures or FIXTURES_DIR
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
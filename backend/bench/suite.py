@@ -0,0 +1,262 @@
+"""
+End-to-end benchmark that needs no network: Alpha Vantage responses and news pages are
+replayed from bench/fixtures and the LLM is the streaming stub of bench.stub_upstreams.
+
+Run from the backend folder:
+    python -m bench.suite                     # run and compare with bench/baseline.json
+    python -m bench.suite --save-baseline     # run and store the numbers as the new baseline
+    python -m bench.suite --record AAPL MSFT  # refresh the fixtures from the live APIs
+
+It measures, for every fixture ticker:
+- the busy time of each build stage and the size of the published index
+- recall@k and MRR on the labeled questions in fixtures/questions.json, with query latency p50/p99
+- /ask/ throughput and latency at each --users level, with the answer cache off
+
+It exits with status 1 when a metric is worse than the baseline by more than the tolerance.
+Timings depend on the machine, so the baseline is not committed (bench/baseline.json is
+git-ignored). Save it and compare against it on the same machine:
+    git checkout main && python -m bench.suite --save-baseline
+    git checkout my-branch && python -m bench.suite
+In CI, run --save-baseline on the main branch, keep bench/baseline.json as a build
+artifact, and restore it before running the comparison on a branch on the same runner type.
+Everything runs in a temporary folder; the real data/ folder and API quota are never touched.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uvicorn
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+
+# Metrics where a larger value is better; every other metric is a time or a size
+HIGHER_IS_BETTER = ("recall", "mrr", "throughput")
+# Changes smaller than these are noise, whatever their relative size
+NOISE_FLOOR = {"_seconds": 0.05, "_ms": 5.0}
+
+
+def configure(workdir: str, stub_url: str, args):
+    """Points every backend setting at the stubs and the temporary folder. Must run before backend imports."""
+    os.environ.update({
+        "ALPHA_VANTAGE_URL": f"{stub_url}/query",
+        "ALPHA_VANTAGE_API_KEY": "bench",
+        "ALPHA_VANTAGE_CALLS_PER_MINUTE": "100000",
+        "ALPHA_VANTAGE_CALLS_PER_DAY": "1000000",
+        "ALPHA_VANTAGE_CACHE_FILE": os.path.join(workdir, "alpha_vantage_cache.db"),
+        "ARTICLE_CACHE_FILE": os.path.join(workdir, "article_cache.db"),
+        "INDEX_ROOT": os.path.join(workdir, "indexes"),
+        "OPEN_ROUTER_BASE_URL": f"{stub_url}/v1",
+        "OPEN_ROUTER_API_KEY": "bench",
+        "PREWARM_ENABLED": "0",
+        "PREWARM_HISTORY_FILE": os.path.join(workdir, "query_history.db"),
+        "STUB_FIXTURES": FIXTURES_DIR,
+        "STUB_LLM_TTFT": str(args.llm_ttft),
+        "STUB_LLM_TOKENS": str(args.llm_tokens),
+    })
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE_TTL"] = "0"
+
+
+def serve(app, port: int) -> uvicorn.Server:
+    """Starts `app` on a background thread and returns once it accepts requests."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def fixture_tickers() -> list:
+    names = os.listdir(os.path.join(FIXTURES_DIR, "alpha_vantage"))
+    return sorted(name[len("NEWS_SENTIMENT-"):-len(".json")] for name in names if name.startswith("NEWS_SENTIMENT-"))
+
+
+def folder_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def bench_builds(tickers: list) -> dict:
+    """Builds every ticker from scratch and sums the busy time of each stage."""
+    import index_builder
+    import index_store
+
+    results = {"build.wall_seconds": 0.0, "index.bytes": 0, "index.chunks": 0}
+    for ticker in tickers:
+        response = index_builder.build_stock_index(ticker, incremental=False)
+        if "error" in response:
+            sys.exit(f"Build of {ticker} failed: {response['error']}")
+        for stage, entry in response["throughput"].items():
+            if stage == "wall_seconds":
+                results["build.wall_seconds"] += entry
+            else:
+                key = f"build.{stage}_seconds"
+                results[key] = results.get(key, 0.0) + entry["busy_seconds"]
+        results["index.bytes"] += folder_bytes(index_store.version_dir(ticker, response["version"]))
+        results["index.chunks"] += response["num_vectors"]
+    return {name: round(value, 3) if isinstance(value, float) else value for name, value in results.items()}
+
+
+def bench_retrieval(questions: list, k: int) -> dict:
+    """Recall@k and MRR of the labeled article among the retrieved chunks' sources, and query latency."""
+    from bench.load_test import percentile
+    import dedup
+    import index_store
+    import retrieval
+
+    hits, reciprocal, latencies = 0, 0.0, []
+    for item in questions:
+        ticker = item["ticker"]
+        index, chunks, lexical = retrieval.load_shard(ticker, index_store.current_version(ticker))
+        start = time.perf_counter()
+        retrieved = retrieval.fetch_chunks(chunks, retrieval.search(index, lexical, item["question"], k))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        ranks = [r for r, chunk in enumerate(retrieved) if any(item["article"] in url for url in dedup.chunk_sources(chunk))]
+        if ranks:
+            hits += 1
+            reciprocal += 1 / (ranks[0] + 1)
+    return {
+        f"retrieval.recall@{k}": round(hits / len(questions), 3),
+        "retrieval.mrr": round(reciprocal / len(questions), 3),
+        "retrieval.p50_ms": round(percentile(latencies, 50), 2),
+        "retrieval.p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+async def bench_users(base_url: str, ticker: str, levels: list, requests_per_user: int) -> dict:
+    """/ask/ throughput and latency at each number of concurrent users."""
+    from bench.load_test import run_level
+
+    results = {}
+    for users in levels:
+        level = await run_level(base_url, ticker, users, requests_per_user)
+        results[f"ask.users_{users}.throughput"] = round(level["throughput"], 2)
+        results[f"ask.users_{users}.ttfb_p50_ms"] = round(level["ttfb_p50"] * 1000, 1)
+        results[f"ask.users_{users}.p50_ms"] = round(level["latency_p50"] * 1000, 1)
+        results[f"ask.users_{users}.p99_ms"] = round(level["latency_p99"] * 1000, 1)
+    return results
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Prints each metric next to its baseline and returns the names of those that regressed."""
+    regressions = []
+    print(f"{'metric':<34} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, value in current.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<34} {'-':>12} {value:>12} {'new':>8}")
+            continue
+        change = (value - base) / base if base else 0.0
+        higher = any(word in name for word in HIGHER_IS_BETTER)
+        floor = next((delta for suffix, delta in NOISE_FLOOR.items() if name.endswith(suffix)), 0)
+        # Retrieval quality is deterministic, so any drop counts
+        allowed = 0.0 if "recall" in name or "mrr" in name else tolerance
+        worse = -change if higher else change
+        regressed = worse > allowed and abs(value - base) > floor
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<34} {base:>12} {value:>12} {change:>+7.0%}{'  REGRESSED' if regressed else ''}")
+    return regressions
+
+
+def record(tickers: list):
+    """Saves live Alpha Vantage responses and the pages of their articles as fixtures."""
+    import alpha_vantage
+    import article_fetcher
+
+    urls_file = os.path.join(FIXTURES_DIR, "articles", "urls.json")
+    with open(urls_file) as f:
+        pages = json.load(f)
+    for ticker in tickers:
+        news, overview = alpha_vantage.get_news(ticker), alpha_vantage.get_overview(ticker)
+        if not alpha_vantage.is_valid(news) or not alpha_vantage.is_valid(overview):
+            sys.exit(f"Alpha Vantage returned no data for {ticker}: {news if not alpha_vantage.is_valid(news) else overview}")
+        for function, data in (("NEWS_SENTIMENT", news), ("OVERVIEW", overview)):
+            with open(os.path.join(FIXTURES_DIR, "alpha_vantage", f"{function}-{ticker}.json"), "w") as f:
+                json.dump(data, f, indent=1)
+        for item in news.get("feed", []):
+            name = hashlib.sha1(item["url"].encode("utf-8")).hexdigest()[:16] + ".html"
+            try:
+                html = article_fetcher.download(item["url"])
+            except Exception as e:
+                print(f"Skipped {item['url']}: {e}")
+                continue
+            with open(os.path.join(FIXTURES_DIR, "articles", name), "w", encoding="utf-8") as f:
+                f.write(html)
+            pages[item["url"]] = name
+    with open(urls_file, "w") as f:
+        json.dump(pages, f, indent=1)
+    print("Recorded. Add labeled questions for the new articles to fixtures/questions.json.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5, help="Retrieved chunks checked for recall")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16], help="Concurrent /ask/ users to measure")
+    parser.add_argument("--requests-per-user", type=int, default=5)
+    parser.add_argument("--llm-ttft", type=float, default=0.2, help="Stub LLM time to first token, seconds")
+    parser.add_argument("--llm-tokens", type=int, default=20, help="Tokens per stub LLM answer")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the answer cache on for /ask/")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown of timings")
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--record", nargs="+", metavar="TICKER", help="Refresh fixtures from the live APIs instead")
+    args = parser.parse_args()
+
+    if args.record:
+        record([ticker.upper() for ticker in args.record])
+        return
+
+    # Backend modules read their settings once on import, and some use paths relative to the
+    # working directory, so configure and move into a scratch folder before importing them
+    workdir = tempfile.mkdtemp(prefix="finrag-bench-")
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    configure(workdir, stub_url, args)
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+
+    from bench import stub_upstreams
+    stub_upstreams.stub_base_url = stub_url
+    serve(stub_upstreams.app, args.stub_port)
+
+    tickers = fixture_tickers()
+    with open(os.path.join(FIXTURES_DIR, "questions.json")) as f:
+        questions = json.load(f)
+    print(f"Benchmarking {', '.join(tickers)} with {len(questions)} labeled questions in {workdir}")
+
+    results = bench_builds(tickers)
+    results.update(bench_retrieval(questions, args.k))
+
+    import server
+    serve(server.app, args.port)
+    results.update(asyncio.run(bench_users(f"http://127.0.0.1:{args.port}", tickers[0], args.users, args.requests_per_user)))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=1)
+        print(f"Saved baseline to {args.baseline}")
+    elif not baseline:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to store one")
+    elif regressions:
+        print(f"{len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+import index_builder
+import metrics
+from concurrency import BUILD_WORKERS, build_executor, run_blocking
+
+# Finished jobs kept around for status polling
+MAX_FINISHED_JOBS = 200
+
+# job_id -> job dict, oldest first
+_jobs = OrderedDict()
+# (ticker, full) -> job_id of its queued or running build, used to coalesce duplicate requests
+_active = {}
+_tasks = {}
+# A job holds a slot from its news fetch to the end of its build, so queued jobs don't fetch early
+_slots = asyncio.Semaphore(BUILD_WORKERS)
+
+
+def submit(ticker: str, full: bool = False) -> dict:
+    """
+    Queues an index build for `ticker` and returns its job at once.
+    A build of the same ticker and mode (full or incremental) already queued or running is
+    returned instead of starting another. Must be called from the event loop.
+    """
+    ticker, full = ticker.upper(), bool(full)
+    job_id = _active.get((ticker, full))
+    if job_id is not None:
+        _jobs[job_id]["coalesced"] += 1
+        return dict(_jobs[job_id])
+
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "ticker": ticker,
+        "full": full,
+        "status": "queued",
+        "stage": "queued",
+        "coalesced": 0,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "result": None,
+    }
+    _jobs[job["job_id"]] = job
+    _active[(ticker, full)] = job["job_id"]
+    _tasks[job["job_id"]] = asyncio.create_task(_run(job))
+    _prune()
+    return dict(job)
+
+
+def get(job_id: str) -> dict:
+    """Returns the current state of a job, or None if it is unknown or was pruned."""
+    job = _jobs.get(job_id)
+    return dict(job) if job is not None else None
+
+
+async def wait(job_id: str) -> dict:
+    """Waits for a job to finish and returns its final state. Cancelling the waiter leaves the build running."""
+    task = _tasks.get(job_id)
+    if task is not None:
+        await asyncio.shield(task)
+    return get(job_id)
+
+
+def list_jobs() -> list:
+    """Returns every tracked job, oldest first."""
+    return [dict(job) for job in _jobs.values()]
+
+
+async def _run(job: dict):
+    """Waits for a build slot, fetches the news feed, then runs the blocking build in the build executor."""
+    def report(stage):
+        # Also called from the worker thread; plain assignments are safe to read from the loop
+        job["stage"] = stage
+        if job["status"] == "queued":
+            job["status"] = "running"
+            job["started_at"] = time.time()
+
+    with metrics.trace("build", ticker=job["ticker"], job=job["job_id"][:8]):
+        try:
+            job["stage"] = "waiting for a build worker"
+            async with _slots:
+                report("fetching news")
+                news = await index_builder.get_stock_news_async(job["ticker"])
+                if "error" in news:
+                    result = news
+                else:
+                    result = await run_blocking(
+                        build_executor, index_builder.build_stock_index,
+                        job["ticker"], not job["full"], news, report
+                    )
+        except Exception as e:
+            result = {"error": f"Index build failed: {e}"}
+    metrics.count("builds_failed" if "error" in result else "builds_done")
+
+    job["result"] = result
+    job["status"] = "failed" if "error" in result else "done"
+    job["stage"] = job["status"]
+    job["finished_at"] = time.time()
+    _active.pop((job["ticker"], job["full"]), None)
+    _tasks.pop(job["job_id"], None)
+
+
+def _prune():
+    """Forgets the oldest finished jobs beyond MAX_FINISHED_JOBS."""
+    finished = [job_id for job_id, job in _jobs.items() if job["finished_at"] is not None]
+    for job_id in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+        del _jobs[job_id]
+
+
+async def shutdown():
+    """Cancels builds that are still running when the server stops."""
+    for task in list(_tasks.values()):
+        task.cancel()
@@ -1,93 +1,167 @@
 import os
-import pickle
-import requests
-import faiss
-# import time
-from sentence_transformers import SentenceTransformer
-from openai import OpenAI
+import asyncio
+import time
+import alpha_vantage
+import answer_cache
+import context_builder
+import index_store
+import metrics
+import retrieval
+from concurrency import cpu_executor, run_blocking
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 
 # Load API Keys
 load_dotenv()
-ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
 OPEN_ROUTER_API_KEY = os.getenv("OPEN_ROUTER_API_KEY")
 
-# File paths for storing FAISS index
-CHUNKS_FILE = "data/chunks.pkl"
-FAISS_FILE = "data/faiss_store.pkl"
+# OpenRouter model used to answer questions
+OPEN_ROUTER_BASE_URL = os.getenv("OPEN_ROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_MODEL = "meta-llama/llama-3.3-70b-instruct:free"
+# Cross-ticker questions share the overview budget; beyond this many companies overviews are left out
+MULTI_OVERVIEW_MAX = int(os.getenv("MULTI_OVERVIEW_MAX", 3))
+# Overview text when the ticker list is empty, e.g. "*" before any index is built
+NO_OVERVIEW = "No company overview: no ticker was given."
+_async_client = None
+
 
 ### 🔹 Fetch & Store Company Overview ###
-def get_company_overview(api_key, ticker):
-    """Fetches the company overview from Alpha Vantage and returns as formatted text."""
-    url = "https://www.alphavantage.co/query"
-    params = {"function": "OVERVIEW", "symbol": ticker, "apikey": api_key}
+def get_company_overview(ticker):
+    """Fetches the company overview through the shared, cached Alpha Vantage client and returns it as formatted text."""
+    tickers = parse_tickers(ticker)
+    if not tickers:
+        return NO_OVERVIEW
+    if len(tickers) > 1:
+        if len(tickers) > MULTI_OVERVIEW_MAX:
+            return f"Overviews are omitted for questions about more than {MULTI_OVERVIEW_MAX} companies."
+        return join_overviews(tickers, [get_company_overview_data(t) for t in tickers])
+    return format_company_overview(get_company_overview_data(tickers[0]))
+
+
+def get_company_overview_data(ticker):
+    with metrics.timer("overview"):
+        return alpha_vantage.get_overview(ticker)
+
+
+async def get_company_overview_async(ticker):
+    """Fetches the company overview without blocking the event loop."""
+    tickers = parse_tickers(ticker)
+    if not tickers:
+        return NO_OVERVIEW
+    if len(tickers) > 1:
+        if len(tickers) > MULTI_OVERVIEW_MAX:
+            return f"Overviews are omitted for questions about more than {MULTI_OVERVIEW_MAX} companies."
+        return join_overviews(tickers, await asyncio.gather(*[get_company_overview_data_async(t) for t in tickers]))
+    return format_company_overview(await get_company_overview_data_async(tickers[0]))
 
-    response = requests.get(url, params=params)
-    data = response.json()
 
+async def get_company_overview_data_async(ticker):
+    with metrics.timer("overview"):
+        return await alpha_vantage.get_overview_async(ticker)
+
+
+def format_company_overview(data, max_tokens=None):
+    """Formats the useful fields of an Alpha Vantage OVERVIEW response as `key: value` lines within the overview token budget."""
     if "Symbol" not in data:
         return f"Error fetching company overview: {data}"
 
     # Convert JSON dictionary to formatted text
-    overview_text = "\n".join([f"{key}: {val}" for key, val in data.items()])
+    overview_text = context_builder.trim_overview(data, max_tokens)
     return overview_text  # Returns formatted string
 
 
-def retrieve_relevant_chunks(index, processed_chunks, user_query, k=10):
-    """Retrieves top-k relevant chunks along with their sources."""
-    encoder = SentenceTransformer("BAAI/bge-base-en")
+def join_overviews(tickers, overviews):
+    """Formats one overview per ticker, splitting the overview token budget between them."""
+    max_tokens = context_builder.OVERVIEW_MAX_TOKENS // len(tickers)
+    return "\n\n".join(f"[{t}]\n{format_company_overview(data, max_tokens)}" for t, data in zip(tickers, overviews))
+
+
+def parse_tickers(ticker):
+    """
+    Splits a comma-separated ticker list ("AAPL,MSFT") into upper-case tickers, without repeats.
+    "*" stands for every ticker with a published index.
+    """
+    if ticker.strip() == "*":
+        return index_store.list_tickers()
+    tickers = []
+    for t in ticker.split(","):
+        t = t.strip().upper()
+        if t and t not in tickers:
+            tickers.append(t)
+    return tickers
 
-    query_vector = encoder.encode([user_query])
-    faiss.normalize_L2(query_vector)
 
-    # Perform FAISS search
-    _, indices = index.search(query_vector, k=k)
+def pin_versions(ticker):
+    """
+    Returns ({ticker: current version}, [tickers without an index]) for a ticker or ticker list.
+    A concurrent rebuild publishes a new version without touching the pinned ones.
+    """
+    versions, missing = {}, []
+    for t in parse_tickers(ticker):
+        version = index_store.current_version(t)
+        if version is None:
+            missing.append(t)
+        else:
+            versions[t] = version
+    return versions, missing
 
-    retrieved_docs = []
-    for i in indices[0]:
-        if i < len(processed_chunks):  # Ensure index is within range
-            retrieved_docs.append({
-                "text": processed_chunks[i]["text"],  # ✅ Use processed_chunks directly
-                "source": processed_chunks[i]["source"]  # ✅ Keep source information
-            })
 
-    return retrieved_docs  # Returns text chunks with sources
+def cache_key(versions, filters=None):
+    """The answer cache's (ticker, version) key of a possibly cross-ticker, filtered question."""
+    if len(versions) == 1 and not filters:
+        return next(iter(versions.items()))
+    scope = ",".join(versions) + "".join(f"|{name}={value}" for name, value in sorted((filters or {}).items()))
+    return scope, ",".join(versions.values())
 
 
 def format_retrieved_text(retrieved_docs):
     """Formats retrieved documents into structured text for LLM input."""
     formatted_text = "\n=========\n".join(
-        [f"Content: {doc['text']}\nSource: {doc['source']}" for doc in retrieved_docs]
+        [context_builder.format_chunk(doc) for doc in retrieved_docs]
     )
     
     return formatted_text
 
 
 ### 🔹 Query LLM ###
-def query_llm_with_retrieval(ticker, user_query):
-    """Retrieves relevant news chunks and queries OpenRouter LLM."""
-    # Load FAISS Index
-    # if not os.path.exists(FAISS_FILE) or not os.path.exists(CHUNKS_FILE):
-    #     return {"error": "FAISS index or processed chunks not found. Please build index first."}
+def retrieve_context(ticker, user_query, version=None, filters=None):
+    """
+    Retrieves relevant news chunks for the question and formats them for the prompt.
+    `ticker` may list several tickers; `version` is then a {ticker: version} dict (see pin_versions).
+    `filters` holds the optional start, end and source filters of retrieval.search_shards.
+    """
+    # Pin the current versions; a concurrent rebuild publishes a new one without touching them
+    if isinstance(version, dict):
+        versions = version
+    elif version is not None:
+        versions = {ticker.upper(): version}
+    else:
+        versions = pin_versions(ticker)[0]
+    if not versions:
+        raise FileNotFoundError(f"No index found for {ticker}. Please build the index first.")
 
-    with open(FAISS_FILE, "rb") as f:
-        index = pickle.load(f)  # ✅ Load only FAISS index
+    budget = context_builder.news_budget(user_query, template_tokens())
+    if len(versions) > 1 or filters:
+        # Cross-ticker or filtered: fan out over the per-ticker shards and merge their results
+        hits = retrieval.search_shards(versions, user_query, context_builder.CANDIDATE_CHUNKS, **(filters or {}))
+        return format_retrieved_text(context_builder.select_hits(hits, budget))
+    (ticker, version), = versions.items()
 
-    with open(CHUNKS_FILE, "rb") as f:
-        processed_chunks = pickle.load(f)  # ✅ Load processed chunks separately
+    # Reuse the in-memory copy of this version if it is already loaded
+    index, processed_chunks, lexical = retrieval.load_shard(ticker, version)
 
-    # Retrieve top-k relevant documents
-    retrieved_docs = retrieve_relevant_chunks(index, processed_chunks, user_query, k=10)
+    # Retrieve candidates, then keep diverse chunks that fit the prompt's news budget
+    ids = retrieval.search(index, lexical, user_query, context_builder.CANDIDATE_CHUNKS)
+    retrieved_docs = context_builder.select_chunks(index, processed_chunks, ids, budget)
 
     # Format Retrieved Docs for Prompt
     retrieved_text = format_retrieved_text(retrieved_docs)
 
-    # Load Company Overview
-    company_overview = get_company_overview(ALPHA_VANTAGE_API_KEY, ticker)
+    return retrieved_text
 
-    # OpenRouter API Client
-    client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=OPEN_ROUTER_API_KEY)
 
+def make_messages(company_overview, retrieved_text, user_query):
+    """Builds the LLM prompt from the company overview and retrieved news."""
     # Construct LLM Prompt
     messages = [
         {
@@ -112,18 +186,117 @@ def query_llm_with_retrieval(ticker, user_query):
         }
     ]
 
+    return messages
+
+
+def template_tokens():
+    """Tokens of the prompt without overview, news or question."""
+    return context_builder.count_tokens(make_messages("", "", "")[0]["content"])
+
+
+def build_messages(ticker, user_query, version=None, filters=None):
+    """Retrieves relevant news chunks and the company overview and builds the LLM prompt."""
+    retrieved_text = retrieve_context(ticker, user_query, version, filters)
+
+    # Load Company Overview
+    company_overview = get_company_overview(ticker)
+
+    messages = make_messages(company_overview, retrieved_text, user_query)
+    context_builder.report(ticker, messages, {"overview": company_overview, "news": retrieved_text, "question": user_query})
+    return messages
+
+
+async def build_messages_async(ticker, user_query, version=None, filters=None):
+    """Builds the LLM prompt, running retrieval in the CPU executor while the overview is fetched."""
+    retrieved_text, company_overview = await asyncio.gather(
+        run_blocking(cpu_executor, retrieve_context, ticker, user_query, version, filters),
+        get_company_overview_async(ticker),
+    )
+    messages = make_messages(company_overview, retrieved_text, user_query)
+    context_builder.report(ticker, messages, {"overview": company_overview, "news": retrieved_text, "question": user_query})
+    return messages
+
+
+def query_llm_with_retrieval(ticker, user_query, filters=None):
+    """Retrieves relevant news chunks and queries OpenRouter LLM. `ticker` may list several tickers."""
+    versions, _ = pin_versions(ticker)
+    key = cache_key(versions, filters) if versions else None
+    if key is not None:
+        answer = answer_cache.lookup(*key, user_query)
+        if answer is not None:
+            metrics.count("answer_cache_hits")
+            return answer
+
+    start = time.perf_counter()
+    messages = build_messages(ticker, user_query, versions or None, filters)
+
+    # OpenRouter API Client
+    client = OpenAI(base_url=OPEN_ROUTER_BASE_URL, api_key=OPEN_ROUTER_API_KEY)
+
     # Call OpenRouter's API
-    completion = client.chat.completions.create(
-        model="meta-llama/llama-3.3-70b-instruct:free",
-        messages=messages
+    with metrics.timer("llm_total"):
+        completion = client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages
+        )
+
+    answer = completion.choices[0].message.content
+    answer_cache.put(*key, user_query, answer, time.perf_counter() - start)
+    return answer
+
+
+def get_async_client():
+    """Returns the shared async OpenRouter client, so streamed answers reuse its connection pool."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(base_url=OPEN_ROUTER_BASE_URL, api_key=OPEN_ROUTER_API_KEY)
+    return _async_client
+
+
+async def stream_llm_with_retrieval(ticker, user_query, filters=None):
+    """
+    Retrieves relevant news chunks and yields the OpenRouter LLM answer token by token as it is generated.
+    `ticker` may list several tickers ("AAPL,MSFT", or "*" for all); `filters` narrows the news searched.
+    """
+    versions, missing = await run_blocking(cpu_executor, pin_versions, ticker)
+    if missing or not versions:
+        yield f"No index found for {', '.join(missing) or ticker.upper()}. Please build the index first."
+        return
+    key = cache_key(versions, filters)
+
+    # The same (or a near-identical) question on these index versions was answered already
+    answer = await run_blocking(cpu_executor, answer_cache.lookup, *key, user_query)
+    if answer is not None:
+        metrics.count("answer_cache_hits")
+        yield answer
+        return
+
+    start = time.perf_counter()
+    messages = await build_messages_async(ticker, user_query, versions, filters)
+
+    llm_start = time.perf_counter()
+    stream = await get_async_client().chat.completions.create(
+        model=LLM_MODEL,
+        messages=messages,
+        stream=True
     )
+    tokens = []
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            if not tokens:
+                metrics.observe("llm_ttft", time.perf_counter() - llm_start)
+            tokens.append(chunk.choices[0].delta.content)
+            yield chunk.choices[0].delta.content
+    metrics.observe("llm_total", time.perf_counter() - llm_start)
+    metrics.count("llm_tokens", len(tokens))
 
-    return completion.choices[0].message.content
+    # Only complete answers are cached; a client disconnect ends the generator before this point
+    await run_blocking(cpu_executor, answer_cache.put, *key, user_query, "".join(tokens), time.perf_counter() - start)
 
 
 ### 🔹 Interactive CLI ###
-# if __name__ == "__main__":
-#     ticker = input("Enter stock ticker: ").upper()
-#     user_query = input("\nNow ask a financial question: ")
-#     print("\n=== AI Response ===\n")
-#     print(query_llm_with_retrieval(ticker, user_query))
+if __name__ == "__main__":
+    ticker = input("Enter stock ticker: ").upper()
+    user_query = input("\nNow ask a financial question: ")
+    print("\n=== AI Response ===\n")
+    print(query_llm_with_retrieval(ticker, user_query))
@@ -0,0 +1,129 @@
+import json
+import mmap
+import os
+import numpy as np
+
+# On-disk layout of a chunk store directory:
+#   chunks.txt      UTF-8 text of every chunk, back to back
+#   offsets.npy     int64[n + 1] byte offsets of chunk i's text: [offsets[i], offsets[i + 1])
+#   source_ids.npy  int32[n] row in sources.json for chunk i, or -1 if the chunk was removed
+#   sources.json    one {"url", "published"} record per article
+# Chunks merged from near-duplicates list their other sources in CSR form:
+#   extra_offsets.npy  int64[n + 1] chunk i's extra sources are extra_ids[extra_offsets[i]:extra_offsets[i + 1]]
+#   extra_ids.npy      int32 rows in sources.json
+# and, when the builder passed them, the SimHash of each chunk (0 for removed slots):
+#   signatures.npy     uint64[n]
+TEXT_NAME = "chunks.txt"
+OFFSETS_NAME = "offsets.npy"
+SOURCE_IDS_NAME = "source_ids.npy"
+SOURCES_NAME = "sources.json"
+EXTRA_OFFSETS_NAME = "extra_offsets.npy"
+EXTRA_IDS_NAME = "extra_ids.npy"
+SIGNATURES_NAME = "signatures.npy"
+
+
+def write(path: str, processed_chunks: list, signatures: list = None):
+    """
+    Writes a chunk list (dicts with text/source/published and optionally all merged
+    `sources`, or None for removed slots) as a compact store in the directory `path`.
+    `signatures` are the chunks' SimHashes, saved so later updates need not hash them again.
+    """
+    source_index = {}
+    sources = []
+    offsets = np.zeros(len(processed_chunks) + 1, dtype=np.int64)
+    source_ids = np.full(len(processed_chunks), -1, dtype=np.int32)
+    extra_offsets = np.zeros(len(processed_chunks) + 1, dtype=np.int64)
+    extra_ids = []
+
+    def source_id(url, published):
+        if url not in source_index:
+            source_index[url] = len(sources)
+            sources.append({"url": url, "published": published})
+        return source_index[url]
+
+    with open(os.path.join(path, TEXT_NAME), "wb") as f:
+        position = 0
+        for i, chunk in enumerate(processed_chunks):
+            if chunk is not None:
+                data = chunk["text"].encode("utf-8")
+                f.write(data)
+                position += len(data)
+                urls = chunk.get("sources") or [chunk["source"]]
+                published = chunk.get("published", "")
+                source_ids[i] = source_id(urls[0], published)
+                extra_ids.extend(source_id(url, published) for url in urls[1:])
+            offsets[i + 1] = position
+            extra_offsets[i + 1] = len(extra_ids)
+
+    np.save(os.path.join(path, OFFSETS_NAME), offsets)
+    np.save(os.path.join(path, SOURCE_IDS_NAME), source_ids)
+    np.save(os.path.join(path, EXTRA_OFFSETS_NAME), extra_offsets)
+    np.save(os.path.join(path, EXTRA_IDS_NAME), np.array(extra_ids, dtype=np.int32))
+    with open(os.path.join(path, SOURCES_NAME), "w") as f:
+        json.dump(sources, f)
+    if signatures is not None:
+        np.save(os.path.join(path, SIGNATURES_NAME), np.array([s or 0 for s in signatures], dtype=np.uint64))
+
+
+def exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, OFFSETS_NAME))
+
+
+class ChunkStore:
+    """
+    Read-only view of a chunk store that behaves like the chunk list it was written from:
+    store[i] is {"text", "source", "sources", "published"} for FAISS id i, or None for a removed chunk.
+    Text and arrays are memory-mapped, so only the rows that are read are paged in.
+    """
+
+    def __init__(self, path: str):
+        self.offsets = np.load(os.path.join(path, OFFSETS_NAME), mmap_mode="r")
+        self.source_ids = np.load(os.path.join(path, SOURCE_IDS_NAME), mmap_mode="r")
+        with open(os.path.join(path, SOURCES_NAME)) as f:
+            self.sources = json.load(f)
+        self.extra_offsets = self.extra_ids = None
+        if os.path.exists(os.path.join(path, EXTRA_OFFSETS_NAME)):
+            self.extra_offsets = np.load(os.path.join(path, EXTRA_OFFSETS_NAME), mmap_mode="r")
+            self.extra_ids = np.load(os.path.join(path, EXTRA_IDS_NAME), mmap_mode="r")
+        self.signatures = None  # Stores written before signatures were saved have none
+        if os.path.exists(os.path.join(path, SIGNATURES_NAME)):
+            self.signatures = np.load(os.path.join(path, SIGNATURES_NAME), mmap_mode="r")
+
+        text_path = os.path.join(path, TEXT_NAME)
+        self._text = b""
+        if os.path.getsize(text_path) > 0:
+            with open(text_path, "rb") as f:
+                self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.source_ids)
+
+    def __getitem__(self, i):
+        i = int(i)
+        if i < 0:
+            raise IndexError(i)
+        source_id = self.source_ids[i]
+        if source_id < 0:
+            return None
+        records = [self.sources[source_id]]
+        if self.extra_offsets is not None:
+            extra = self.extra_ids[self.extra_offsets[i]:self.extra_offsets[i + 1]]
+            records += [self.sources[j] for j in extra]
+        text = self._text[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+        return {
+            "text": text,
+            "source": records[0]["url"],
+            "sources": [record["url"] for record in records],
+            "published": max(record["published"] for record in records),
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes mapped for this store (text plus arrays); resident memory is only what was read."""
+        extra_bytes = self.extra_offsets.nbytes + self.extra_ids.nbytes if self.extra_offsets is not None else 0
+        signature_bytes = self.signatures.nbytes if self.signatures is not None else 0
+        return len(self._text) + self.offsets.nbytes + self.source_ids.nbytes + extra_bytes + signature_bytes
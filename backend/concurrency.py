@@ -0,0 +1,50 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+
+# Bounded executors keep blocking work off the event loop.
+# Encoding and FAISS search release the GIL, so threads run them in parallel.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", os.cpu_count() or 1))
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", 2))
+# Per-ticker shard searches of one cross-ticker query; separate from cpu_executor, whose
+# workers submit them and would otherwise wait on their own pool
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", max(4, os.cpu_count() or 1)))
+
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+build_executor = ThreadPoolExecutor(max_workers=BUILD_WORKERS, thread_name_prefix="build")
+shard_executor = ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="shard")
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 15))
+_http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the shared async HTTP client so upstream connections are pooled across requests."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Closes the shared HTTP client on shutdown."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def run_blocking(executor, fn, *args, **kwargs):
+    """
+    Runs a blocking function in `executor` and awaits its result without blocking the event loop.
+    The caller's context variables (e.g. the metrics trace) are visible in the worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, fn, *args, **kwargs))
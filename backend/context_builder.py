@@ -0,0 +1,161 @@
+import os
+import threading
+import numpy as np
+import dedup
+
+try:
+    import tiktoken
+    # The OpenRouter models don't publish their tokenizers; cl100k counts are close for Llama 3.
+    # The encoding is downloaded on first use; point TIKTOKEN_CACHE_DIR at a saved copy to run offline
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception as e:  # Not installed, or the encoding file can't be downloaded
+    _encoding = None
+    print(f"tiktoken unavailable ({e}); prompt token counts and the context budget use a ~4 characters per token estimate")
+
+# Prompt size limits, in tokens
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+OVERVIEW_MAX_TOKENS = int(os.getenv("OVERVIEW_MAX_TOKENS", 350))
+# Chunks retrieved as candidates, and the most that are put in the prompt
+CANDIDATE_CHUNKS = int(os.getenv("CONTEXT_CANDIDATE_CHUNKS", 20))
+MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", 10))
+# MMR trade-off: 1.0 ranks by relevance only, lower values favour chunks unlike those already picked
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.7))
+
+# OVERVIEW fields worth prompt space, in the order they are shown
+OVERVIEW_FIELDS = [
+    "Symbol", "Name", "Exchange", "Sector", "Industry", "FiscalYearEnd", "LatestQuarter",
+    "MarketCapitalization", "RevenueTTM", "GrossProfitTTM", "EBITDA", "EPS", "DilutedEPSTTM",
+    "PERatio", "ForwardPE", "PEGRatio", "PriceToBookRatio", "ProfitMargin", "OperatingMarginTTM",
+    "ReturnOnEquityTTM", "QuarterlyEarningsGrowthYOY", "QuarterlyRevenueGrowthYOY",
+    "DividendYield", "Beta", "AnalystTargetPrice", "52WeekHigh", "52WeekLow", "Description",
+]
+
+_stats = {"requests": 0, "prompt_tokens": 0, "max_prompt_tokens": 0, "over_budget": 0}
+_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """Counts tokens with tiktoken when available, otherwise estimates ~4 characters per token."""
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cuts `text` to at most `max_tokens`, at a word boundary when possible."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        cut = _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        cut = text[:max_tokens * 4]
+    return cut.rsplit(" ", 1)[0] + "..."
+
+
+def trim_overview(data: dict, max_tokens: int = None) -> str:
+    """
+    Formats the useful fields of an OVERVIEW response as `key: value` lines within `max_tokens`.
+    Empty fields are dropped and the description is shortened to whatever budget is left.
+    """
+    max_tokens = max_tokens or OVERVIEW_MAX_TOKENS
+    lines = [
+        f"{key}: {data[key]}" for key in OVERVIEW_FIELDS
+        if key != "Description" and data.get(key) not in (None, "", "None", "-")
+    ]
+    text = "\n".join(lines)
+    description = data.get("Description")
+    if description:
+        remaining = max_tokens - count_tokens(text) - count_tokens("\nDescription: ")
+        if remaining > 20:
+            text += f"\nDescription: {truncate(description, remaining)}"
+    return truncate(text, max_tokens)
+
+
+def format_chunk(chunk: dict) -> str:
+    # Chunks from cross-ticker searches say which company's news they belong to
+    ticker = f"Ticker: {chunk['ticker']}\n" if chunk.get("ticker") else ""
+    return f"{ticker}Content: {chunk['text']}\nSource: {', '.join(dedup.chunk_sources(chunk))}"
+
+
+def _chunk_vectors(index, ids: list):
+    """Stored vectors of the candidate chunks, or None when the index can't reconstruct them."""
+    try:
+        return np.vstack([index.reconstruct(int(i)) for i in ids]).astype(np.float32)
+    except RuntimeError:
+        return None
+
+
+def select_chunks(index, processed_chunks, ids: list, budget: int, max_chunks: int = None) -> list:
+    """
+    Picks chunks from the ranked candidate `ids` with maximal marginal relevance: each pick
+    trades its rank-based relevance against its highest cosine similarity to chunks already
+    picked, so overlapping stories don't crowd out other news. Chunks that would overflow
+    the token `budget` are skipped. Returns the picked chunks in the order they were chosen.
+    """
+    candidates = [(i, processed_chunks[i]) for i in ids if 0 <= i < len(processed_chunks)]
+    candidates = [(i, chunk) for i, chunk in candidates if chunk is not None]
+    if not candidates:
+        return []
+    vectors = _chunk_vectors(index, [i for i, _ in candidates])
+    return _select([chunk for _, chunk in candidates], vectors, budget, max_chunks)
+
+
+def select_hits(hits: list, budget: int, max_chunks: int = None) -> list:
+    """select_chunks for the ranked hits of retrieval.search_shards, which carry their own vectors."""
+    if not hits:
+        return []
+    vectors = None
+    if all(hit["vector"] is not None for hit in hits):
+        vectors = np.vstack([hit["vector"] for hit in hits]).astype(np.float32)
+    return _select([hit["chunk"] for hit in hits], vectors, budget, max_chunks)
+
+
+def _select(candidates: list, vectors, budget: int, max_chunks: int = None) -> list:
+    max_chunks = max_chunks or MAX_CHUNKS
+    relevance = 1 - np.arange(len(candidates)) / len(candidates)
+    similarity = vectors @ vectors.T if vectors is not None else np.zeros((len(candidates), len(candidates)))
+    costs = [count_tokens(format_chunk(chunk)) for chunk in candidates]
+
+    picked = []
+    redundancy = np.zeros(len(candidates))
+    remaining = list(range(len(candidates)))
+    while remaining and len(picked) < max_chunks:
+        scores = [MMR_LAMBDA * relevance[c] - (1 - MMR_LAMBDA) * redundancy[c] for c in remaining]
+        best = remaining.pop(int(np.argmax(scores)))
+        if costs[best] > budget:
+            continue
+        budget -= costs[best]
+        picked.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return [candidates[c] for c in picked]
+
+
+def news_budget(user_query: str, template_tokens: int) -> int:
+    """Tokens left for news after the prompt template, the overview allowance and the question."""
+    return CONTEXT_TOKEN_BUDGET - template_tokens - OVERVIEW_MAX_TOKENS - count_tokens(user_query)
+
+
+def report(ticker: str, messages: list, parts: dict) -> dict:
+    """
+    Counts the tokens of a finished prompt, logs them with the size of each part and
+    adds them to the running totals. Returns the per-request counts.
+    """
+    counts = {name: count_tokens(text) for name, text in parts.items()}
+    counts["prompt_tokens"] = sum(count_tokens(message["content"]) for message in messages)
+    with _lock:
+        _stats["requests"] += 1
+        _stats["prompt_tokens"] += counts["prompt_tokens"]
+        _stats["max_prompt_tokens"] = max(_stats["max_prompt_tokens"], counts["prompt_tokens"])
+        _stats["over_budget"] += counts["prompt_tokens"] > CONTEXT_TOKEN_BUDGET
+    print(f"Prompt for {ticker}: " + ", ".join(f"{name} {count}" for name, count in counts.items()) + " tokens")
+    return counts
+
+
+def context_stats() -> dict:
+    """Returns average and largest prompt sizes against the budget."""
+    with _lock:
+        stats = dict(_stats)
+    stats["avg_prompt_tokens"] = round(stats["prompt_tokens"] / stats["requests"], 1) if stats["requests"] else 0
+    stats["budget"] = CONTEXT_TOKEN_BUDGET
+    stats["tokenizer"] = "tiktoken" if _encoding is not None else "heuristic"
+    return stats
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import numpy as np
+from lexical_index import tokenize
+
+# Near-duplicate detection for syndicated copies of the same story. Each chunk gets a
+# 64-bit SimHash of its word shingles; chunks within MAX_DISTANCE differing bits are
+# duplicates. Signatures are split into MAX_DISTANCE + 1 bands, so any two duplicates
+# agree exactly on at least one band and only chunks sharing a band are compared.
+MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", 6))
+SHINGLE_SIZE = 3
+
+_BANDS = MAX_DISTANCE + 1
+_BAND_BITS = 64 // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def simhash(text: str) -> int:
+    """Returns the 64-bit SimHash of the word shingles of `text`."""
+    tokens = tokenize(text)
+    shingles = [" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(max(len(tokens) - SHINGLE_SIZE + 1, 1))]
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles],
+        dtype=np.uint64,
+    )
+    # Bit b of the signature is set when most shingle hashes have bit b set
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    majority = (bits.sum(axis=0) * 2 > len(hashes)).astype(np.uint8)
+    return int.from_bytes(np.packbits(majority, bitorder="little").tobytes(), "little")
+
+
+class SignatureIndex:
+    """Near-duplicate lookup over signatures added one at a time, e.g. as articles stream in."""
+
+    def __init__(self):
+        self.signatures = []
+        self._buckets = [{} for _ in range(_BANDS)]
+
+    def add(self, signature) -> int:
+        """
+        Appends `signature` and returns the position of an earlier representative within
+        MAX_DISTANCE bits of it, or its own position if there is none. Only signatures without a
+        match become representatives that later ones are compared against; a duplicate is stored
+        but never matched. None is stored as a placeholder and returns None.
+        """
+        i = len(self.signatures)
+        self.signatures.append(signature)
+        if signature is None:
+            return None
+        bands = [(signature >> (band * _BAND_BITS)) & _BAND_MASK for band in range(_BANDS)]
+        for band, key in enumerate(bands):
+            match = next(
+                (j for j in self._buckets[band].get(key, ()) if bin(signature ^ self.signatures[j]).count("1") <= MAX_DISTANCE),
+                None,
+            )
+            if match is not None:
+                return match
+        for band, key in enumerate(bands):
+            self._buckets[band].setdefault(key, []).append(i)
+        return i
+
+
+def representatives(signatures: list) -> list:
+    """
+    Returns rep where rep[i] is the first earlier signature within MAX_DISTANCE bits of
+    signature i, or i itself if it has no near-duplicate before it. None entries map to None.
+    """
+    index = SignatureIndex()
+    return [index.add(signature) for signature in signatures]
+
+
+def chunk_sources(chunk: dict) -> list:
+    """All source URLs of a chunk; chunks written before deduplication have only `source`."""
+    return chunk.get("sources") or [chunk["source"]]
+
+
+def _absorb(target: dict, duplicate: dict):
+    """Adds the sources of `duplicate` to `target`, which keeps the latest publish time."""
+    sources = chunk_sources(target)
+    target["sources"] = sources + [url for url in chunk_sources(duplicate) if url not in sources]
+    target["published"] = max(target.get("published", ""), duplicate.get("published", ""))
+
+
+def merge(chunks: list, signatures: list) -> tuple:
+    """
+    Merges near-duplicate chunks into the first of each group, which keeps every source URL.
+    Returns (merged chunks, rows of `chunks` they came from) so matching vectors can be selected.
+    """
+    reps = representatives(signatures)
+    merged, rows, position = [], [], {}
+    for i, (chunk, rep) in enumerate(zip(chunks, reps)):
+        if rep == i:
+            position[i] = len(merged)
+            merged.append(dict(chunk, sources=chunk_sources(chunk)))
+            rows.append(i)
+        else:
+            _absorb(merged[position[rep]], chunk)
+    return merged, rows
+
+
+def merge_into(existing: list, new_chunks: list, signatures: list, new_signatures: list) -> list:
+    """
+    Folds new chunks that duplicate a chunk of `existing` (a chunk list with None slots,
+    updated in place) into it. `signatures` and `new_signatures` are the SimHashes of both
+    lists, None for removed slots. Returns the positions of the new chunks to keep.
+    """
+    reps = representatives(list(signatures) + list(new_signatures))
+
+    keep = []
+    for i, chunk in enumerate(new_chunks):
+        rep = reps[len(existing) + i]
+        if rep < len(existing):
+            _absorb(existing[rep], chunk)
+        else:
+            keep.append(i)
+    return keep
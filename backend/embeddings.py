@@ -0,0 +1,168 @@
+import os
+import queue
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import faiss
+import numpy as np
+from model_registry import get_encoder, DEFAULT_MODEL
+
+# Tunables for chunk embedding during index builds
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 32))
+EMBED_PROCESSES = int(os.getenv("EMBED_PROCESSES", 1))
+
+# Multi-process encoder pools, one per (model, processes); each worker loads its own model copy
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def _get_pool(model_name: str, processes: int):
+    with _pool_lock:
+        key = (model_name, processes)
+        if key not in _pools:
+            _pools[key] = get_encoder(model_name).start_multi_process_pool(target_devices=["cpu"] * processes)
+        return _pools[key]
+
+
+def stop_pools():
+    """Terminates the worker processes of every multi-process encoder pool."""
+    with _pool_lock:
+        for model_name, processes in list(_pools):
+            get_encoder(model_name).stop_multi_process_pool(_pools.pop((model_name, processes)))
+
+
+def encode_batches(texts: list, batch_size: int = None, processes: int = None, model_name: str = DEFAULT_MODEL):
+    """
+    Encodes `texts` and yields (positions, vectors) batches of L2-normalized float32 vectors,
+    where positions are the indexes of the batch's texts in `texts`.
+    Texts are encoded in order of length so each batch pads to a similar length.
+    With more than one process, groups of batches are spread over a multi-process pool.
+    """
+    batch_size = batch_size or EMBED_BATCH_SIZE
+    processes = processes or EMBED_PROCESSES
+    order = np.argsort([len(text) for text in texts], kind="stable")
+
+    encoder = get_encoder(model_name)
+    pool = _get_pool(model_name, processes) if processes > 1 else None
+    # A pool needs several batches per call to keep every worker busy
+    step = batch_size * processes * 4 if pool is not None else batch_size
+
+    for start in range(0, len(order), step):
+        positions = order[start:start + step]
+        group = [texts[i] for i in positions]
+        if pool is not None:
+            vectors = encoder.encode_multi_process(group, pool, batch_size=batch_size, chunk_size=batch_size)
+        else:
+            vectors = encoder.encode(group, batch_size=batch_size)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        yield positions.astype(np.int64), vectors
+
+
+def encode(texts: list, batch_size: int = None, processes: int = None, model_name: str = DEFAULT_MODEL):
+    """Encodes `texts` into an array of L2-normalized float32 vectors in input order."""
+    vectors = None
+    for positions, batch in encode_batches(texts, batch_size, processes, model_name):
+        if vectors is None:
+            vectors = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+        vectors[positions] = batch
+    return vectors
+
+
+### Query encoding ###
+# Questions repeat across users and tickers ("latest earnings", "risks"), so their
+# vectors are cached by normalized text. Cache misses that arrive within a few
+# milliseconds of each other are merged into a single forward pass.
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 1024))
+QUERY_BATCH_WINDOW = float(os.getenv("QUERY_BATCH_WINDOW_MS", 5)) / 1000
+QUERY_MAX_BATCH = int(os.getenv("QUERY_MAX_BATCH", 64))
+
+_query_cache = OrderedDict()
+_query_lock = threading.Lock()
+_query_stats = {"hits": 0, "misses": 0, "batches": 0, "batched_queries": 0}
+_query_queue = queue.Queue()
+_batcher = None
+
+
+def normalize_query(text: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation so near-identical questions share a key."""
+    return " ".join(text.lower().split()).rstrip("?!. ")
+
+
+def _cache_put(key: str, vector):
+    """Caller holds _query_lock."""
+    _query_cache[key] = vector
+    _query_cache.move_to_end(key)
+    while len(_query_cache) > QUERY_CACHE_SIZE:
+        _query_cache.popitem(last=False)
+
+
+def _run_batcher():
+    """Collects pending queries for up to QUERY_BATCH_WINDOW and encodes them together."""
+    while True:
+        pending = [_query_queue.get()]
+        deadline = time.perf_counter() + QUERY_BATCH_WINDOW
+        while len(pending) < QUERY_MAX_BATCH:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(_query_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        # Identical questions in the same window are encoded once
+        keys = list(dict.fromkeys(key for key, _ in pending))
+        try:
+            vectors = np.ascontiguousarray(get_encoder().encode(keys, batch_size=len(keys)), dtype=np.float32)
+            faiss.normalize_L2(vectors)
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            continue
+
+        by_key = dict(zip(keys, vectors))
+        with _query_lock:
+            for key, vector in by_key.items():
+                _cache_put(key, vector)
+            _query_stats["batches"] += 1
+            _query_stats["batched_queries"] += len(pending)
+        for key, future in pending:
+            future.set_result(by_key[key])
+
+
+def _ensure_batcher():
+    global _batcher
+    with _query_lock:
+        if _batcher is None:
+            _batcher = threading.Thread(target=_run_batcher, name="query-batcher", daemon=True)
+            _batcher.start()
+
+
+def encode_query(text: str):
+    """
+    Returns the L2-normalized query vector for `text` as a (1, dim) float32 array,
+    from the LRU cache when possible and otherwise through the micro-batching encoder.
+    """
+    key = normalize_query(text)
+    with _query_lock:
+        vector = _query_cache.get(key)
+        if vector is not None:
+            _query_cache.move_to_end(key)
+            _query_stats["hits"] += 1
+            return vector.reshape(1, -1).copy()
+        _query_stats["misses"] += 1
+
+    _ensure_batcher()
+    future = Future()
+    _query_queue.put((key, future))
+    return future.result().reshape(1, -1).copy()
+
+
+def query_cache_stats() -> dict:
+    """Returns hit/miss counts of the query cache and how many queries each batch merged."""
+    with _query_lock:
+        stats = dict(_query_stats, entries=len(_query_cache))
+    stats["avg_batch_size"] = round(stats["batched_queries"] / stats["batches"], 2) if stats["batches"] else 0
+    return stats
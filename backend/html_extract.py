@@ -0,0 +1,10 @@
+# HTML text extraction for article_fetcher's parse workers. Spawned workers import only this
+# module to unpickle the task, so it must not import the backend's other modules.
+
+
+def extract_text(html: str) -> str:
+    """Extracts readable text from an HTML page. Runs in a worker process."""
+    from unstructured.partition.html import partition_html
+
+    elements = partition_html(text=html)
+    return "\n\n".join(str(el) for el in elements)
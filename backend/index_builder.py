@@ -1,114 +1,414 @@
 import os
-import requests
-import pandas as pd
-# import time
-import faiss
-import pickle
+import time
+import numpy as np
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from langchain_community.document_loaders import UnstructuredURLLoader
+import alpha_vantage
+from model_registry import get_encoder, DEFAULT_MODEL
+import index_cache
+import index_store
+import article_fetcher
+import article_cache
+import embeddings
+import index_factory
+import dedup
+import metrics
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-# Load API Key from .env
 load_dotenv()
-API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
+
+# Single-slot index files used before per-ticker storage; adopted on startup
+LEGACY_CHUNKS_FILE = "data/chunks.pkl"
+LEGACY_FAISS_FILE = "data/faiss_store.faiss"
+LEGACY_META_FILE = "data/index_meta.json"
+# Ticker of a legacy index that has no meta file (the original single-slot index wrote none)
+LEGACY_INDEX_TICKER = os.getenv("LEGACY_INDEX_TICKER")
+
+# Incremental updates drop articles older than this
+MAX_ARTICLE_AGE_DAYS = int(os.getenv("MAX_ARTICLE_AGE_DAYS", 7))
+PUBLISHED_FORMAT = "%Y%m%dT%H%M%S"
+# New chunks are encoded in batches of this many while later articles are still downloading
+PIPELINE_EMBED_CHUNKS = int(os.getenv("PIPELINE_EMBED_CHUNKS", 256))
 
 def get_stock_news(ticker: str) -> list:
     """
-    Fetch stock news from Alpha Vantage API.
+    Fetch stock news through the shared, cached Alpha Vantage client.
     """
-    ticker = ticker.upper()
-    url = "https://www.alphavantage.co/query"
-    
-    print(f"API_KEY: {API_KEY}")
-    
-    params = {
-        "function": "NEWS_SENTIMENT",
-        "tickers": ticker,
-        "apikey": API_KEY,
-        "sort": "RELEVANCE"
-    }
+    with metrics.timer("news"):
+        data = alpha_vantage.get_news(ticker)
+    return parse_news_response(data)
 
-    response = requests.get(url, params=params)
-    if response.status_code != 200:
-        return {"error": "Failed to fetch data"}
+async def get_stock_news_async(ticker: str) -> list:
+    """
+    Fetch stock news through the shared Alpha Vantage client without blocking the event loop.
+    """
+    with metrics.timer("news"):
+        data = await alpha_vantage.get_news_async(ticker)
+    return parse_news_response(data)
 
-    data = response.json()
-    print("Full API Response:", data) 
+def parse_news_response(data: dict) -> list:
+    """
+    Extract the article feed from a NEWS_SENTIMENT response.
+    """
+    if "error" in data:
+        return data
     if "feed" not in data:
-        return {"error": "No news available"}
+        print("Alpha Vantage response without a feed:", data)
+        return {"error": data.get("Information") or data.get("Note") or "No news available"}
 
     return data["feed"]
 
-def parse_articles(articles: list) -> list:
+def get_text_splitter() -> RecursiveCharacterTextSplitter:
     """
-    Extract article text using LangChain's UnstructuredURLLoader.
+    Returns the splitter used for article text. Chunks carry their start offset.
     """
-    urls = [article['url'] for article in articles]
-    loader = UnstructuredURLLoader(urls=urls)
-    
-    try:
-        parsed_docs = loader.load()
-        return parsed_docs
-    except Exception as e:
-        return {"error": f"Failed to parse articles: {str(e)}"}
+    return RecursiveCharacterTextSplitter(
+        separators=['\n\n', '\n', '.', ','],
+        chunk_size=1000,
+        add_start_index=True
+    )
 
-def split_text(docs: list) -> list:
+# Cached embeddings are only valid for the same model and chunking
+EMBED_KEY = f"{DEFAULT_MODEL}|chunk_size=1000"
+
+def split_offsets(text: str, tally: dict = None) -> list:
     """
-    Split text into smaller chunks.
+    Split one article and return the (start, end) offsets of its chunks.
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        separators=['\n\n', '\n', '.', ','],
-        chunk_size=1000
-    )
+    with metrics.timer("split", tally):
+        chunks = get_text_splitter().create_documents([text])
+    return [(chunk.metadata["start_index"], chunk.metadata["start_index"] + len(chunk.page_content)) for chunk in chunks]
 
-    chunks = text_splitter.split_documents(docs)
-    # Store chunks with metadata
-    processed_chunks = [{"text": chunk.page_content, "source": chunk.metadata.get("source", "Unknown")} for chunk in chunks]
+def encode_texts(texts: list, tally: dict = None):
+    """
+    Encode texts into L2-normalized float32 vectors, in length-sorted batches.
+    """
+    with metrics.timer("embed", tally, len(texts)):
+        vectors = embeddings.encode(texts)
+    metrics.count("chunks_embedded", len(texts))
+    return vectors
 
-    return processed_chunks
+def build_index(processed_chunks: list, vectors, kind: str = None, tally: dict = None):
+    """
+    Build a FAISS index from text chunks and their vectors (see prepare_chunks).
+    The index type (exact, HNSW or IVF-PQ) is chosen by corpus size unless `kind` is given.
+    """
+    kind = index_factory.choose_kind(len(processed_chunks), kind)
+
+    # Chunk i gets FAISS id i, so chunks can later be dropped with remove_ids
+    index = index_factory.make_index(vectors.shape[1], len(processed_chunks), kind)
+    with metrics.timer("index", tally, len(processed_chunks)):
+        index_factory.train(index, vectors)
+        index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
 
-def build_index(processed_chunks: list):
+    return index_factory.set_search_params(index)
+
+def prepare_chunks(articles: list, progress=None, tally=None, indexed_signatures: list = None, indexed_vector=None) -> tuple:
     """
-    Build a FAISS index from text chunks.
+    Turn news articles into chunks and their vectors, reusing the article cache.
+    Only articles whose URL and content are both unseen are split and encoded,
+    and near-duplicate chunks are merged into one that keeps all their source URLs.
+    New articles stream through fetch → parse → split → embed: each is split as soon as it
+    is extracted, and its chunks are encoded in batches of PIPELINE_EMBED_CHUNKS while later
+    articles are still downloading. An article's full text is kept only until its batch is
+    encoded and cached; from then on only its chunk texts and vectors are. `tally` collects
+    per-stage items and busy time.
+    When updating an index, pass the SimHashes of its chunks (None for removed slots) as
+    `indexed_signatures` and `indexed_vector(id)` returning a chunk's stored vector: new copies
+    of indexed chunks then reuse that vector instead of being encoded.
+    Returns (processed_chunks, vectors, signatures, skipped_urls).
     """
-    encoder = SentenceTransformer("BAAI/bge-base-en")
-    texts = [chunk["text"] for chunk in processed_chunks]
-    vectors = encoder.encode(texts)
-    faiss.normalize_L2(vectors)
+    progress = progress or (lambda stage: None)
+    progress("fetching articles")
+
+    # Chunks of this build by (url, chunk number), cached articles first. Syndicated
+    # copies of a story differ only in boilerplate; a new chunk that nearly duplicates an
+    # earlier chunk reuses its vector instead of being encoded again.
+    keys, signatures, reps = [], [], []
+    seen = dedup.SignatureIndex()
+    # Chunks of the index being updated come first; a rep below 0 is indexed chunk rep + num_indexed
+    if indexed_vector is not None:
+        for signature in indexed_signatures:
+            seen.add(signature)
+    num_indexed = len(seen.signatures)
+    ready = {}  # url -> {"texts", "first", "vectors"} of every article whose vectors are known
+
+    def add_chunks(url, texts):
+        first = len(keys)
+        for j, text in enumerate(texts):
+            signature = dedup.simhash(text)
+            keys.append((url, j))
+            signatures.append(signature)
+            reps.append(seen.add(signature) - num_indexed)
+        return first
+
+    def add_ready(url, entry):
+        texts = [entry["text"][start:end] for start, end in entry["offsets"]]
+        ready[url] = {"texts": texts, "first": add_chunks(url, texts), "vectors": entry["vectors"]}
+
+    new_urls = []
+    for article in articles:
+        url = article['url']
+        if url in ready or url in new_urls:
+            continue
+        entry = article_cache.get_by_url(url, EMBED_KEY)
+        if entry is not None:
+            add_ready(url, entry)
+        else:
+            new_urls.append(url)
+    num_known = len(keys)
+
+    encoded = {}  # position -> vector, for the batch being flushed
+    to_encode = {}  # position -> chunk text waiting for the next embedding batch
+    waiting = []  # (url, text, offsets, first position) of articles whose vectors aren't all ready
+    skipped_urls = []
+    stats = {"linked": 0, "encoded": 0, "skipped": 0}
 
-    dim = vectors.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(vectors)
+    def vector(i):
+        if reps[i] < 0:
+            return indexed_vector(reps[i] + num_indexed)
+        url, j = keys[reps[i]]
+        return ready[url]["vectors"][j] if url in ready else encoded[reps[i]]
 
-    return index
+    def flush():
+        # Encode the batch, then cache each article whose chunks all have vectors now and drop its full text
+        if to_encode:
+            progress(f"embedding {stats['encoded'] + len(to_encode)} chunks")
+            encoded.update(zip(to_encode, encode_texts(list(to_encode.values()), tally)))
+            stats["encoded"] += len(to_encode)
+            to_encode.clear()
+        dim = get_encoder().get_sentence_embedding_dimension()
+        for url, text, offsets, first in waiting:
+            vectors = np.array([vector(i) for i in range(first, first + len(offsets))], dtype=np.float32).reshape(-1, dim)
+            article_cache.put(url, text, offsets, vectors, EMBED_KEY)
+            ready[url] = {"texts": [text[start:end] for start, end in offsets], "first": first, "vectors": vectors}
+        waiting.clear()
+        encoded.clear()
 
-def build_stock_index(ticker: str):
+    for url, doc, reason in article_fetcher.iter_articles(new_urls, tally):
+        if doc is None:
+            print(f"Skipped {url}: {reason}")
+            skipped_urls.append(url)
+            continue
+
+        # Content already cached under another URL is only linked
+        text = doc.page_content
+        entry = article_cache.get(article_cache.content_hash(text), EMBED_KEY)
+        if entry is not None:
+            article_cache.link_url(url, article_cache.content_hash(text))
+            add_ready(url, entry)
+            stats["linked"] += 1
+            continue
+
+        offsets = split_offsets(text, tally)
+        first = add_chunks(url, [text[start:end] for start, end in offsets])
+        to_encode.update((i, text[offsets[i - first][0]:offsets[i - first][1]]) for i in range(first, len(keys)) if reps[i] == i)
+        waiting.append((url, text, offsets, first))
+        if len(to_encode) >= PIPELINE_EMBED_CHUNKS:
+            flush()
+    flush()
+
+    published = {article['url']: article.get('time_published', now_published()) for article in articles}
+    chunks, chunk_signatures, vector_blocks = [], [], []
+    for url in published:
+        article = ready.pop(url, None)
+        if article is None or not article["texts"]:
+            continue
+        chunks.extend({"text": text, "source": url, "published": published[url]} for text in article["texts"])
+        chunk_signatures.extend(signatures[article["first"]:article["first"] + len(article["texts"])])
+        vector_blocks.append(article["vectors"])
+
+    # Index one chunk per group of near-duplicates, listing every URL it appeared under
+    processed_chunks, rows = dedup.merge(chunks, chunk_signatures)
+    vectors = gather_rows(vector_blocks, rows)
+    signatures = [chunk_signatures[row] for row in rows]
+    new_chunks = len(keys) - num_known
+    print(f"Deduplication: {len(chunks)} chunks, {len(chunks) - len(processed_chunks)} near-duplicates merged, "
+          f"{new_chunks - stats['encoded']} encodings skipped")
+    print(f"Article cache: {len(articles) - len(new_urls)} cached, "
+          f"{stats['linked']} linked, {len(new_urls) - stats['linked'] - len(skipped_urls)} encoded")
+    return processed_chunks, vectors, signatures, skipped_urls
+
+def gather_rows(blocks: list, rows: list):
+    """
+    Returns rows `rows` of the blocks stacked on top of each other, copied once into a new
+    array instead of stacking every block first. Blocks are released as they are copied.
+    """
+    if not blocks:
+        return None
+    starts = np.cumsum([0] + [len(block) for block in blocks])
+    rows = np.asarray(rows, dtype=np.int64)
+    block_of = np.searchsorted(starts, rows, side="right") - 1
+    vectors = np.empty((len(rows), blocks[0].shape[1]), dtype=np.float32)
+    for b in range(len(blocks)):
+        at = np.flatnonzero(block_of == b)
+        vectors[at] = blocks[b][rows[at] - starts[b]]
+        blocks[b] = None
+    return vectors
+
+def now_published() -> str:
+    """
+    Current time in Alpha Vantage's time_published format (e.g. 20240131T153000).
+    """
+    return datetime.now(timezone.utc).strftime(PUBLISHED_FORMAT)
+
+def built_today(ticker: str) -> bool:
+    """
+    Whether `ticker`'s current index was built or updated today (UTC).
+    """
+    version = index_store.current_version(ticker)
+    if version is None:
+        return False
+    meta = index_store.load_meta_version(ticker, version)
+    updated_at = max(meta.get("updated_at", ""), meta.get("checked_at", ""))
+    return updated_at[:8] == now_published()[:8]
+
+def update_index(ticker: str, news: list, progress=None, tally=None) -> dict:
+    """
+    Incrementally refresh the current index for `ticker` into a new version.
+    Chunks of articles older than MAX_ARTICLE_AGE_DAYS are removed by id, and
+    only articles not yet indexed are encoded and appended.
+    When nothing was added or removed, the current version is kept and only marked as checked.
+    Otherwise the new version is written whole (FAISS index, chunk store, signatures, BM25),
+    since published versions are immutable and memory-mapped by readers: only fetching and
+    encoding scale with the new articles, disk writes still scale with the corpus.
+    Returns None when there is no compatible index to update.
+    """
+    progress = progress or (lambda stage: None)
+    version = index_store.current_version(ticker)
+    if version is None:
+        return None
+
+    # A private, writable copy; readers keep using the published version
+    index, store, _ = index_store.load_version(ticker, version, mmap=False)
+    processed_chunks = list(store)  # The new version rewrites the whole chunk store
+    # Signatures saved with the chunks; versions published before they were saved are hashed when needed
+    saved = getattr(store, "signatures", None)
+    signatures = [int(s) if chunk is not None else None for s, chunk in zip(saved, processed_chunks)] if saved is not None else None
+    if not index_factory.supports_incremental(index):
+        return None  # Built before ids were assigned, or an HNSW graph; needs a full rebuild
+    if index_factory.index_kind(index) != index_factory.choose_kind(index.ntotal):
+        return None  # Outgrew its index type; rebuild with the one suited to its size
+
+    # Drop chunks of articles that are too old. Removed slots stay as None so ids stay stable.
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=MAX_ARTICLE_AGE_DAYS)).strftime(PUBLISHED_FORMAT)
+    stale_ids = [i for i, chunk in enumerate(processed_chunks) if chunk is not None and chunk.get("published", "") < cutoff]
+    if stale_ids:
+        with metrics.timer("index", tally, len(stale_ids)):
+            index.remove_ids(np.array(stale_ids, dtype=np.int64))
+        for i in stale_ids:
+            processed_chunks[i] = None
+            if signatures is not None:
+                signatures[i] = None
+
+    # Encode and append only articles that are new and recent enough
+    indexed_urls = {url for chunk in processed_chunks if chunk is not None for url in dedup.chunk_sources(chunk)}
+    fresh = [a for a in news if a['url'] not in indexed_urls and a.get('time_published', now_published()) >= cutoff]
+    if fresh and signatures is None:
+        signatures = [dedup.simhash(chunk["text"]) if chunk is not None else None for chunk in processed_chunks]
+    # Flat and HNSW indexes give back the exact vectors they store; IVF-PQ only approximations,
+    # which mustn't end up in the article cache, so there copies of indexed chunks are encoded
+    indexed_vector = index.reconstruct if index_factory.index_kind(index) != "ivfpq" else None
+    new_chunks, vectors, new_signatures, skipped_urls = (
+        prepare_chunks(fresh, progress, tally, signatures, indexed_vector) if fresh else ([], None, [], [])
+    )
+    # New copies of stories already indexed only add their URL to the existing chunk
+    merged = 0
+    if new_chunks:
+        keep = dedup.merge_into(processed_chunks, new_chunks, signatures, new_signatures)
+        merged = len(new_chunks) - len(keep)
+        new_chunks = [new_chunks[i] for i in keep]
+        vectors = vectors[keep]
+        signatures += [new_signatures[i] for i in keep]
+    if not new_chunks and not stale_ids and not merged:
+        # Publishing would only invalidate the index and answer caches of an identical version
+        index_store.update_meta(ticker, version, {"checked_at": now_published()})
+        return {
+            "message": f"Index for {ticker} is already up to date",
+            "version": version,
+            "num_vectors": index.ntotal,
+            "added": 0,
+            "removed": 0,
+            "skipped_urls": skipped_urls,
+        }
+    if new_chunks:
+        ids = np.arange(len(processed_chunks), len(processed_chunks) + len(new_chunks), dtype=np.int64)
+        with metrics.timer("index", tally, len(new_chunks)):
+            index.add_with_ids(vectors, ids)
+        processed_chunks.extend(new_chunks)
+
+    progress("saving index")
+    with metrics.timer("publish", tally):
+        new_version = index_store.publish(ticker, index, processed_chunks, {"updated_at": now_published()}, signatures)
+
+    return {
+        "message": f"Index updated for {ticker}",
+        "version": new_version,
+        "num_vectors": index.ntotal,
+        "added": len(new_chunks),
+        "removed": len(stale_ids),
+        "skipped_urls": skipped_urls,
+    }
+
+def adopt_legacy_index():
+    """
+    Move an index built before per-ticker storage into the versioned store.
+    """
+    return index_store.adopt_legacy_index(LEGACY_FAISS_FILE, LEGACY_CHUNKS_FILE, LEGACY_META_FILE, LEGACY_INDEX_TICKER)
+
+def build_stock_index(ticker: str, incremental: bool = True, news: list = None, progress=None):
     """
     Full pipeline: Fetch news → Parse content → Split text → Build FAISS index.
+    With `incremental`, an existing index for the same ticker is updated in place instead.
+    Pass `news` when the feed was already fetched (e.g. asynchronously by the server),
+    and `progress` to be called with the name of each stage as it starts.
     """
+    ticker = ticker.upper()
+    progress = progress or (lambda stage: None)
+    tally = {}  # Items and busy time per pipeline stage
+    start = time.perf_counter()
+
     # Fetch News
-    news = get_stock_news(ticker)
+    if news is None:
+        news = get_stock_news(ticker)
     if "error" in news:
         return news
 
-    # Extract & Process Articles
-    parsed_docs = parse_articles(news)
-    if "error" in parsed_docs:
-        return parsed_docs
-
-    # Text Splitting
-    processed_chunks = split_text(parsed_docs)
-    if not processed_chunks:
-        return {"error": "No text available after splitting"}
-    
-    # Save the list to a pickle file
-    with open("data/chunks.pkl", "wb") as f:
-        pickle.dump(processed_chunks, f)
-
-    index = build_index(processed_chunks)
-    # Save the FAISS index to a pickle file
-    with open("data/faiss_store.pkl", "wb") as f:
-        pickle.dump(index, f)
-
-    return {"message": f"Index built for {ticker}", "num_vectors": len(processed_chunks)}
\ No newline at end of file
+    # One writer per ticker; readers are never blocked
+    with index_store.ticker_lock(ticker):
+        if incremental:
+            previous = index_store.current_version(ticker)
+            response = update_index(ticker, news, progress, tally)
+            if response is not None:
+                if response["version"] != previous:
+                    index_cache.invalidate(ticker)
+                return dict(response, throughput=report_throughput(ticker, tally, start))
+
+        # Extract, split & encode articles, reusing cached ones
+        processed_chunks, vectors, signatures, skipped_urls = prepare_chunks(news, progress, tally)
+        if not processed_chunks:
+            return {"error": "No text available after splitting"}
+
+        index = build_index(processed_chunks, vectors, tally=tally)
+
+        # Publish as a new version; the swap is atomic and readers keep their snapshot
+        progress("saving index")
+        with metrics.timer("publish", tally):
+            version = index_store.publish(ticker, index, processed_chunks, {"updated_at": now_published()}, signatures)
+
+    # Loaded copies of the previous build are stale now
+    index_cache.invalidate(ticker)
+
+    return {"message": f"Index built for {ticker}", "version": version, "num_vectors": len(processed_chunks), "skipped_urls": skipped_urls,
+            "throughput": report_throughput(ticker, tally, start)}
+
+def report_throughput(ticker: str, tally: dict, start: float) -> dict:
+    """
+    Logs and returns how many items each stage of a build handled and how fast. Fetch, parse,
+    split and embed overlap, so the build takes about as long as its slowest stage, not their sum.
+    """
+    stages = metrics.throughput(tally, time.perf_counter() - start)
+    print(f"Build {ticker}: " + ", ".join(
+        f"{stage} {entry['items']} in {entry['busy_seconds']}s" for stage, entry in stages.items() if stage != "wall_seconds"
+    ) + f", wall {stages['wall_seconds']}s")
+    return stages
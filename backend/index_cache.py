@@ -0,0 +1,84 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Bounds for the loaded (index, chunks, lexical index) entries kept in memory. Cross-ticker
+# searches touch every shard they cover, so the entry limit must exceed the shard count or
+# each search evicts the shards it is about to read; MAX_BYTES is the real memory bound.
+MAX_ENTRIES = int(os.getenv("INDEX_CACHE_MAX_ENTRIES", 64))
+MAX_BYTES = int(os.getenv("INDEX_CACHE_MAX_BYTES", 512 * 2**20))
+
+# (ticker, version) -> (loaded tuple, size_bytes), least recently used first
+_entries = OrderedDict()
+_lock = threading.Lock()
+_load_locks = {}
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def _entry_size(index, chunks, *extras) -> int:
+    """Estimates the memory held by a loaded index, its chunks and any side indexes (e.g. BM25)."""
+    vector_bytes = index.ntotal * index.d * 4
+    extra_bytes = sum(extra.nbytes for extra in extras if extra is not None)
+    if hasattr(chunks, "nbytes"):
+        return vector_bytes + chunks.nbytes + extra_bytes  # Memory-mapped chunk store
+    text_bytes = sum(len(chunk["text"]) + len(chunk["source"]) for chunk in chunks if chunk is not None)
+    return vector_bytes + text_bytes + extra_bytes
+
+
+def _evict():
+    """Drops least recently used entries until the cache fits its bounds. Caller holds _lock."""
+    total = sum(size for _, size in _entries.values())
+    while _entries and (len(_entries) > MAX_ENTRIES or total > MAX_BYTES):
+        _, (_, size) = _entries.popitem(last=False)
+        total -= size
+        _stats["evictions"] += 1
+
+
+def get_or_load(ticker: str, version, loader):
+    """
+    Returns the cached (index, chunks, ...) tuple for `ticker` at `version`.
+    On a miss `loader()` is called once, even with concurrent callers, and the tuple it returns is cached.
+    """
+    key = (ticker, version)
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return _entries[key][0]
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    with load_lock:
+        with _lock:
+            # Another request may have loaded the same key while we waited
+            if key in _entries:
+                _entries.move_to_end(key)
+                _stats["hits"] += 1
+                return _entries[key][0]
+            _stats["misses"] += 1
+
+        loaded = loader()
+
+        with _lock:
+            _entries[key] = (loaded, _entry_size(*loaded))
+            _evict()
+            _load_locks.pop(key, None)
+        return loaded
+
+
+def invalidate(ticker: str = None):
+    """Drops every cached version of `ticker`, or the whole cache when no ticker is given."""
+    with _lock:
+        stale = [key for key in _entries if ticker is None or key[0] == ticker]
+        for key in stale:
+            del _entries[key]
+        _stats["invalidations"] += len(stale)
+
+
+def cache_stats() -> dict:
+    """Returns hit/miss counters and the current size of the cache."""
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "bytes": sum(size for _, size in _entries.values()),
+        }
@@ -0,0 +1,99 @@
+import os
+import faiss
+import numpy as np
+
+# Index kind: "auto" picks by corpus size, or force "flat", "hnsw" or "ivfpq"
+INDEX_KIND = os.getenv("INDEX_KIND", "auto")
+# Corpus sizes at which auto switches from exact to approximate search
+FLAT_MAX_VECTORS = int(os.getenv("FLAT_MAX_VECTORS", 50_000))
+HNSW_MAX_VECTORS = int(os.getenv("HNSW_MAX_VECTORS", 2_000_000))
+
+# Build parameters
+HNSW_M = int(os.getenv("HNSW_M", 32))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 200))
+PQ_M = int(os.getenv("PQ_M", 48))
+PQ_NBITS = 8
+TRAIN_SAMPLE = int(os.getenv("IVF_TRAIN_SAMPLE", 100_000))
+
+# Search parameters, applied whenever an index is loaded
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))
+
+
+def choose_kind(num_vectors: int, kind: str = None) -> str:
+    """Resolves "auto" to exact search for small corpora and approximate search for large ones."""
+    kind = kind or INDEX_KIND
+    if kind != "auto":
+        return kind
+    if num_vectors <= FLAT_MAX_VECTORS:
+        return "flat"
+    if num_vectors <= HNSW_MAX_VECTORS:
+        return "hnsw"
+    return "ivfpq"
+
+
+def make_index(dim: int, num_vectors: int, kind: str = None):
+    """
+    Creates an empty index that accepts add_with_ids.
+    Flat and HNSW indexes are wrapped in IndexIDMap2; IVF-PQ stores ids itself.
+    """
+    kind = choose_kind(num_vectors, kind)
+    if kind == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+    if kind == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, HNSW_M)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return faiss.IndexIDMap2(hnsw)
+    if kind == "ivfpq":
+        # ~4 * sqrt(n) lists, with enough training points per list
+        nlist = max(1, min(int(4 * np.sqrt(num_vectors)), num_vectors // 39))
+        # PQ needs the dimension to split evenly into sub-quantizers
+        pq_m = max(m for m in range(1, min(PQ_M, dim) + 1) if dim % m == 0)
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, pq_m, PQ_NBITS)
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)  # Lets remove_ids find vectors by id
+        return index
+    raise ValueError(f"Unknown index kind: {kind}")
+
+
+def train(index, vectors):
+    """Trains an index that needs it on a random sample of `vectors`."""
+    if index.is_trained:
+        return
+    sample = vectors
+    if len(vectors) > TRAIN_SAMPLE:
+        rows = np.random.default_rng(0).choice(len(vectors), TRAIN_SAMPLE, replace=False)
+        sample = vectors[np.sort(rows)]
+    faiss.downcast_index(index).train(np.ascontiguousarray(sample, dtype=np.float32))
+
+
+def _inner(index):
+    """Unwraps an IndexIDMap/IndexIDMap2 to the index doing the search."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_kind(index) -> str:
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
+def set_search_params(index, ef_search: int = None, nprobe: int = None):
+    """Applies efSearch / nprobe to an approximate index; exact indexes are left untouched."""
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search or HNSW_EF_SEARCH
+    elif isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = nprobe or IVF_NPROBE
+    return index
+
+
+def supports_incremental(index) -> bool:
+    """Whether chunks can be added and removed by id (HNSW graphs cannot drop vectors)."""
+    if isinstance(index, faiss.IndexIDMap2):
+        return not isinstance(_inner(index), faiss.IndexHNSW)
+    return isinstance(index, faiss.IndexIVF)
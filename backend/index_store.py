@@ -0,0 +1,231 @@
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import faiss
+import chunk_store
+import index_factory
+import lexical_index
+
+# Open flat index storage memory-mapped so workers share vectors through the page cache
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def legacy_path(path: str) -> str:
+    """Returns the pickled index path that predates the native `.faiss` file at `path`."""
+    return os.path.splitext(path)[0] + ".pkl"
+
+
+def index_exists(path: str) -> bool:
+    """Checks for a native index file or a legacy pickle that can be migrated."""
+    return os.path.exists(path) or os.path.exists(legacy_path(path))
+
+
+def save_index(index, path: str):
+    """
+    Writes `index` in FAISS's native format.
+    The file is written next to its destination and renamed so readers never see a partial file.
+    """
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def migrate_legacy_index(path: str) -> bool:
+    """Converts a pickled index into the native file at `path`. Returns False if there is nothing to migrate."""
+    old_path = legacy_path(path)
+    if not os.path.exists(old_path):
+        return False
+
+    with open(old_path, "rb") as f:
+        index = pickle.load(f)
+    save_index(index, path)
+    os.remove(old_path)
+    print(f"Migrated {old_path} -> {path}")
+    return True
+
+
+def load_index(path: str, mmap: bool = True):
+    """
+    Opens the native index at `path`, memory-mapped and read-only by default.
+    A legacy pickle found in its place is migrated once on first load.
+    """
+    if not os.path.exists(path) and not migrate_legacy_index(path):
+        raise FileNotFoundError(f"No FAISS index found at {path}")
+
+    return faiss.read_index(path, MMAP_FLAGS if mmap else 0)
+
+
+def load_chunks(path: str) -> list:
+    """Loads the chunk list. Slots of removed chunks are None."""
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def load_meta(path: str) -> dict:
+    """Reads index metadata, or an empty dict if none was written."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+### Per-ticker versioned store ###
+# data/indexes/<TICKER>/CURRENT names the live version directory. Each version
+# directory (index.faiss, the chunk store and BM25 files, meta.json) is written under a temporary name,
+# renamed into place and never modified afterwards (except for checked_at in meta.json), so a
+# reader that resolved a version keeps a consistent snapshot while newer versions are published.
+INDEX_ROOT = os.getenv("INDEX_ROOT", "data/indexes")
+KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", 3))
+
+INDEX_NAME = "index.faiss"
+# Pickled chunk list written by versions published before the compact chunk store
+CHUNKS_NAME = "chunks.pkl"
+META_NAME = "meta.json"
+
+_ticker_locks = {}
+_ticker_locks_lock = threading.Lock()
+
+
+def ticker_lock(ticker: str) -> threading.Lock:
+    """Returns the lock serialising writers of one ticker's index within this process."""
+    with _ticker_locks_lock:
+        return _ticker_locks.setdefault(ticker.upper(), threading.Lock())
+
+
+def ticker_dir(ticker: str) -> str:
+    return os.path.join(INDEX_ROOT, ticker.upper())
+
+
+def version_dir(ticker: str, version: str) -> str:
+    return os.path.join(ticker_dir(ticker), version)
+
+
+def current_version(ticker: str):
+    """Returns the live version of `ticker`'s index, or None if it was never built."""
+    try:
+        with open(os.path.join(ticker_dir(ticker), "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def list_tickers() -> list:
+    """Returns every ticker with a published index."""
+    if not os.path.isdir(INDEX_ROOT):
+        return []
+    return sorted(t for t in os.listdir(INDEX_ROOT) if current_version(t) is not None)
+
+
+def _versions(ticker: str) -> list:
+    root = ticker_dir(ticker)
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if name.startswith("v") and "." not in name)
+
+
+def publish(ticker: str, index, processed_chunks: list, meta: dict, signatures: list = None) -> str:
+    """
+    Writes a new immutable version of `ticker`'s index and atomically makes it current, with
+    the chunks' near-duplicate `signatures` when given. Returns the new version name.
+    Callers should hold ticker_lock(ticker).
+    """
+    root = ticker_dir(ticker)
+    os.makedirs(root, exist_ok=True)
+
+    tmp_dir = tempfile.mkdtemp(prefix="build.", dir=root)
+    faiss.write_index(index, os.path.join(tmp_dir, INDEX_NAME))
+    chunk_store.write(tmp_dir, processed_chunks, signatures)
+    lexical_index.write(tmp_dir, processed_chunks)
+
+    # Another process may publish the same version number first; take the next one
+    while True:
+        existing = _versions(ticker)
+        version = f"v{int(existing[-1][1:]) + 1 if existing else 1:06d}"
+        with open(os.path.join(tmp_dir, META_NAME), "w") as f:
+            json.dump({**meta, "ticker": ticker.upper(), "version": version}, f)
+        try:
+            os.rename(tmp_dir, version_dir(ticker, version))
+            break
+        except OSError:
+            if not os.path.isdir(version_dir(ticker, version)):
+                raise
+
+    # Swap the CURRENT pointer in one rename
+    pointer_tmp = os.path.join(root, "CURRENT.tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(root, "CURRENT"))
+
+    _prune(ticker)
+    return version
+
+
+def _prune(ticker: str):
+    """Deletes all but the newest KEEP_VERSIONS versions. Memory-mapped readers of a deleted version keep working."""
+    for old in _versions(ticker)[:-KEEP_VERSIONS]:
+        shutil.rmtree(version_dir(ticker, old), ignore_errors=True)
+
+
+def load_version(ticker: str, version: str, mmap: bool = True) -> tuple:
+    """
+    Loads (index, chunks, meta) of one version of `ticker`'s index.
+    Chunks come back as a ChunkStore indexed by FAISS id, or a plain list for older versions.
+    """
+    path = version_dir(ticker, version)
+    index = faiss.read_index(os.path.join(path, INDEX_NAME), MMAP_FLAGS if mmap else 0)
+    index_factory.set_search_params(index)
+    if chunk_store.exists(path):
+        processed_chunks = chunk_store.ChunkStore(path)
+    else:
+        processed_chunks = load_chunks(os.path.join(path, CHUNKS_NAME))
+    return index, processed_chunks, load_meta(os.path.join(path, META_NAME))
+
+
+def load_lexical(ticker: str, version: str):
+    """Loads the BM25 index of one version, or None for versions published before it was built."""
+    path = version_dir(ticker, version)
+    return lexical_index.LexicalIndex(path) if lexical_index.exists(path) else None
+
+
+def load_meta_version(ticker: str, version: str) -> dict:
+    """Reads only the metadata of one version."""
+    return load_meta(os.path.join(version_dir(ticker, version), META_NAME))
+
+
+def update_meta(ticker: str, version: str, fields: dict):
+    """Adds `fields` to the metadata of an existing version; its index and chunks are untouched."""
+    path = os.path.join(version_dir(ticker, version), META_NAME)
+    meta = load_meta(path)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({**meta, **fields}, f)
+    os.replace(tmp, path)
+
+
+def adopt_legacy_index(index_path: str, chunks_path: str, meta_path: str, ticker: str = None):
+    """
+    Publishes a single-slot index from before per-ticker storage (data/faiss_store.*)
+    under the ticker recorded in its metadata, or `ticker` when it has none, then removes the old files.
+    """
+    if not index_exists(index_path) or not os.path.exists(chunks_path):
+        return None
+    meta = load_meta(meta_path)
+    ticker = (meta.get("ticker") or ticker or "").strip().upper()
+    if not ticker:
+        # The original single-slot index never recorded its ticker
+        found = [path for path in (index_path, legacy_path(index_path), chunks_path) if os.path.exists(path)]
+        print(f"Warning: legacy index {', '.join(found)} was not adopted because its ticker is unknown; "
+              "set LEGACY_INDEX_TICKER to the ticker it was built for")
+        return None
+
+    with ticker_lock(ticker):
+        if current_version(ticker) is None:
+            publish(ticker, load_index(index_path, mmap=False), load_chunks(chunks_path), meta)
+    for path in (index_path, chunks_path, meta_path):
+        if os.path.exists(path):
+            os.remove(path)
+    print(f"Moved legacy index for {ticker} into {ticker_dir(ticker)}")
+    return ticker
@@ -0,0 +1,116 @@
+import json
+import os
+import re
+from collections import Counter
+import numpy as np
+
+# BM25 inverted index over the same chunk ids as the FAISS index, so exact tokens
+# that dense vectors blur ("Q3", "2024", "EPS", "$4.05", tickers) can still be matched.
+# Each term's postings are chunk ids with their precomputed BM25 weight, stored
+# back to back in flat arrays:
+#   lexical_vocab.json   term -> row in the offsets array
+#   lexical.npz          offsets int64[terms + 1], ids int32[postings], weights float32[postings]
+VOCAB_NAME = "lexical_vocab.json"
+ARRAYS_NAME = "lexical.npz"
+
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+
+# Keeps decimals and figures together ("4.05", "2024") and splits everything else on punctuation
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "what which who how did does do about".split()
+)
+
+
+def tokenize(text: str) -> list:
+    """Lowercased word and number tokens without stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def write(path: str, processed_chunks: list):
+    """Builds the BM25 index of a chunk list (None slots are skipped) into the directory `path`."""
+    term_freqs = [Counter(tokenize(chunk["text"])) if chunk is not None else Counter() for chunk in processed_chunks]
+    doc_len = np.array([sum(tf.values()) for tf in term_freqs], dtype=np.float32)
+    num_docs = max(int(np.count_nonzero(doc_len)), 1)
+    avg_len = float(doc_len.sum()) / num_docs
+
+    postings = {}
+    for doc_id, tf in enumerate(term_freqs):
+        for term, count in tf.items():
+            postings.setdefault(term, []).append((doc_id, count))
+
+    vocab = {}
+    offsets = [0]
+    ids, weights = [], []
+    for term, docs in postings.items():
+        vocab[term] = len(vocab)
+        idf = np.log(1 + (num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+        doc_ids = np.array([doc_id for doc_id, _ in docs], dtype=np.int32)
+        tf = np.array([count for _, count in docs], dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[doc_ids] / avg_len)
+        ids.append(doc_ids)
+        weights.append((idf * tf * (BM25_K1 + 1) / (tf + norm)).astype(np.float32))
+        offsets.append(offsets[-1] + len(docs))
+
+    np.savez(
+        os.path.join(path, ARRAYS_NAME),
+        offsets=np.array(offsets, dtype=np.int64),
+        ids=np.concatenate(ids) if ids else np.empty(0, dtype=np.int32),
+        weights=np.concatenate(weights) if weights else np.empty(0, dtype=np.float32),
+        num_chunks=np.array([len(processed_chunks)], dtype=np.int64),
+    )
+    with open(os.path.join(path, VOCAB_NAME), "w") as f:
+        json.dump(vocab, f)
+
+
+def exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, ARRAYS_NAME))
+
+
+class LexicalIndex:
+    """BM25 index of one version, held in memory for lookups well under a millisecond."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, VOCAB_NAME)) as f:
+            self.vocab = json.load(f)
+        with np.load(os.path.join(path, ARRAYS_NAME)) as arrays:
+            self.offsets = arrays["offsets"]
+            self.ids = arrays["ids"]
+            self.weights = arrays["weights"]
+            self.num_chunks = int(arrays["num_chunks"][0])
+
+    def search(self, query: str, k: int = 10) -> tuple:
+        """Returns (ids, scores) of the top-k chunks by BM25 score, best first."""
+        rows = [self.vocab[term] for term in set(tokenize(query)) if term in self.vocab]
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # A chunk appears at most once per term, so fancy-indexed adds don't collide
+        scores = np.zeros(self.num_chunks, dtype=np.float32)
+        for row in rows:
+            start, end = self.offsets[row], self.offsets[row + 1]
+            scores[self.ids[start:end]] += self.weights[start:end]
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return matched.astype(np.int64), scores[matched]
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.ids.nbytes + self.weights.nbytes
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 10, rrf_k: int = 60) -> list:
+    """
+    Fuses ranked id lists: each id scores sum(1 / (rrf_k + rank)) over the lists it appears in.
+    Returns the top-k ids, best first. Ids may be any hashable, e.g. (ticker, chunk id) across shards.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking):
+            scores[i] = scores.get(i, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
@@ -1,13 +1,10 @@
 from fastapi import FastAPI
-import requests
-import os
+import alpha_vantage
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 load_dotenv()
 
-API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
-
 app = FastAPI()
 
 # Enable CORS for frontend
@@ -26,17 +23,13 @@ def get_stock_news(symbol: str):
     # Ensure symbol is uppercase (Alpha Vantage requires tickers)
     symbol = symbol.upper()
 
-    url = f"https://www.alphavantage.co/query?function=NEWS_SENTIMENT&tickers={symbol}&apikey={API_KEY}"
-    response = requests.get(url)
-    
-    print("Raw API Response:", response.json())  # Debugging
-
-    if response.status_code == 200:
-        data = response.json()
+    # Shared client: pooled, cached and kept within the API quota
+    data = alpha_vantage.get_news(symbol, sort="LATEST")
 
-        if "Information" in data:
-            return {"error": data["Information"]}  # Return error message
+    if "error" in data:
+        return data
 
-        return {"news": data.get("feed", [])}
+    if "Information" in data:
+        return {"error": data["Information"]}  # Return error message
 
-    return {"error": "Failed to fetch data"}
+    return {"news": data.get("feed", [])}
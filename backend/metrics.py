@@ -0,0 +1,130 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-stage latency histograms and event counters, rendered in the Prometheus text format.
+# Recording is a bisect and a few additions under a lock, so timers can wrap hot paths.
+# Stages: news, fetch, parse, split, embed, index, publish (builds); load, query_embed,
+# search (FAISS), lexical_search (BM25), overview, llm_ttft, llm_total (questions); model_load.
+PREFIX = "finrag"
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_histograms = {}  # stage -> {"buckets": [count per bucket, +Inf last], "sum": seconds, "count": n}
+_counters = {}  # event -> total
+
+# Stage times of the request or build running in this context, logged when it finishes
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def observe(stage: str, seconds: float):
+    """Records one duration of `stage`, also into the current trace if there is one."""
+    slot = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+        histogram["buckets"][slot] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+    trace = _trace.get()
+    if trace is not None:
+        trace["stages"][stage] = trace["stages"].get(stage, 0.0) + seconds
+
+
+def count(event: str, n: int = 1):
+    """Adds `n` to the counter of `event`."""
+    with _lock:
+        _counters[event] = _counters.get(event, 0) + n
+
+
+@contextmanager
+def timer(stage: str, tally: dict = None, items: int = 1):
+    """
+    Times the enclosed block as one observation of `stage`. With `tally`, also adds
+    `items` and the time taken to tally[stage], for the throughput of one build.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        observe(stage, seconds)
+        if tally is not None:
+            with _lock:
+                entry = tally.setdefault(stage, {"items": 0, "seconds": 0.0})
+                entry["items"] += items
+                entry["seconds"] += seconds
+
+
+def throughput(tally: dict, wall_seconds: float) -> dict:
+    """
+    Per-stage items, busy seconds and items per busy second of a tally filled by timer.
+    Stages that overlap have busy times summing to more than `wall_seconds`.
+    """
+    stages = {
+        stage: {
+            "items": entry["items"],
+            "busy_seconds": round(entry["seconds"], 3),
+            "items_per_second": round(entry["items"] / entry["seconds"], 1) if entry["seconds"] else None,
+        }
+        for stage, entry in tally.items()
+    }
+    return dict(stages, wall_seconds=round(wall_seconds, 3))
+
+
+@contextmanager
+def trace(name: str, **labels):
+    """
+    Collects the stage times recorded inside the block, including in executors entered
+    through concurrency.run_blocking, and logs them as one line when the block exits.
+    """
+    current = {"stages": {}, "start": time.perf_counter()}
+    token = _trace.set(current)
+    try:
+        yield current
+    finally:
+        try:
+            _trace.reset(token)
+        except ValueError:
+            pass  # Closed from another context, e.g. an abandoned streaming response
+        total = time.perf_counter() - current["start"]
+        details = " ".join(f"{key}={value}" for key, value in labels.items())
+        stages = " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in current["stages"].items())
+        print(f"[{name}] {details} total={total * 1000:.1f}ms {stages}".strip())
+
+
+def _format_labels(labels: dict) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def render(gauges: dict = None) -> str:
+    """
+    Returns every histogram and counter in the Prometheus text exposition format.
+    `gauges` maps a name to {labels tuple: value} for point-in-time values such as cache sizes.
+    """
+    with _lock:
+        histograms = {stage: dict(h, buckets=list(h["buckets"])) for stage, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = [f"# TYPE {PREFIX}_stage_seconds histogram"]
+    for stage, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, n in zip(list(BUCKETS) + ["+Inf"], histogram["buckets"]):
+            cumulative += n
+            lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+        lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+    lines.append(f"# TYPE {PREFIX}_events_total counter")
+    for event, total in sorted(counters.items()):
+        lines.append(f'{PREFIX}_events_total{{event="{event}"}} {total}')
+
+    for name, values in (gauges or {}).items():
+        lines.append(f"# TYPE {PREFIX}_{name} gauge")
+        for labels, value in values.items():
+            lines.append(f"{PREFIX}_{name}{{{_format_labels(dict(labels))}}} {value}")
+    return "\n".join(lines) + "\n"
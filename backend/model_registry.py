@@ -0,0 +1,70 @@
+import resource
+import threading
+import time
+from sentence_transformers import SentenceTransformer
+import metrics
+
+DEFAULT_MODEL = "BAAI/bge-base-en"
+
+# Loaded encoders and their load statistics, shared by every request in the process
+_models = {}
+_stats = {}
+_registry_lock = threading.Lock()
+_model_locks = {}
+
+
+def _rss_bytes():
+    """Returns the peak resident set size of this process in bytes."""
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_encoder(model_name: str = DEFAULT_MODEL) -> SentenceTransformer:
+    """
+    Returns the process-wide SentenceTransformer for `model_name`, loading it on first use.
+    Concurrent callers asking for the same model wait for a single load.
+    """
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        model_lock = _model_locks.setdefault(model_name, threading.Lock())
+
+    with model_lock:
+        # Another thread may have finished loading while we waited
+        model = _models.get(model_name)
+        if model is not None:
+            return model
+
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        model = SentenceTransformer(model_name)
+        load_seconds = time.perf_counter() - start
+        metrics.observe("model_load", load_seconds)
+
+        param_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+        _stats[model_name] = {
+            "load_seconds": round(load_seconds, 3),
+            "param_bytes": param_bytes,
+            "rss_delta_bytes": max(_rss_bytes() - rss_before, 0),
+        }
+        _models[model_name] = model
+        print(f"Loaded encoder {model_name} in {load_seconds:.2f}s "
+              f"({param_bytes / 2**20:.0f} MiB of weights)")
+        return model
+
+
+def warm_up(model_names=(DEFAULT_MODEL,)):
+    """
+    Loads the given encoders ahead of the first request and runs one tiny encode
+    so lazy initialisation (tokenizer, thread pools) is paid at startup.
+    """
+    for name in model_names:
+        if name not in _models:
+            get_encoder(name).encode(["warm up"])
+
+
+def registry_stats() -> dict:
+    """Returns load time and memory figures for every encoder loaded in this process."""
+    return {name: dict(stats) for name, stats in _stats.items()}
@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import alpha_vantage
+import article_cache
+import build_jobs
+from concurrency import cpu_executor, run_blocking
+import index_builder
+import index_store
+import symbols
+
+# Rebuilds the indexes of a watchlist before market open, so the first question of the day
+# about those tickers finds today's index instead of waiting for a build. The watchlist is
+# PREWARM_WATCHLIST and PREWARM_WATCHLIST_FILE (one ticker per line) plus the tickers asked
+# about most over the last PREWARM_HISTORY_DAYS.
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "1") != "0"
+WATCHLIST = os.getenv("PREWARM_WATCHLIST", "")
+WATCHLIST_FILE = os.getenv("PREWARM_WATCHLIST_FILE", "data/watchlist.txt")
+HISTORY_FILE = os.getenv("PREWARM_HISTORY_FILE", "data/query_history.db")
+HISTORY_TOP = int(os.getenv("PREWARM_HISTORY_TOP", 5))
+HISTORY_DAYS = int(os.getenv("PREWARM_HISTORY_DAYS", 7))
+
+# Run time on trading days, in the exchange's time zone
+PREWARM_AT = os.getenv("PREWARM_AT", "08:00")
+TIMEZONE = os.getenv("PREWARM_TIMEZONE", "America/New_York")
+WEEKDAYS_ONLY = os.getenv("PREWARM_WEEKDAYS_ONLY", "1") != "0"
+
+# Builds run at most this many at a time (and within build_jobs' own worker bound)
+CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", 2))
+# Alpha Vantage calls left untouched for interactive use; each ticker costs up to
+# CALLS_PER_TICKER calls (its news feed, and its overview once the cached one expires)
+RESERVE_CALLS = int(os.getenv("PREWARM_RESERVE_CALLS", 10))
+CALLS_PER_TICKER = 2
+
+_conn = None
+_lock = threading.Lock()
+_task = None
+_running = None
+_last_run = None
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Opens the query history on first use. Caller holds _lock."""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(HISTORY_FILE) or ".", exist_ok=True)
+        _conn = sqlite3.connect(HISTORY_FILE, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS queries (
+                day TEXT NOT NULL,
+                ticker TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, ticker)
+            )
+        """)
+    return _conn
+
+
+def record_query(tickers: list):
+    """Counts a question about `tickers` in the query history."""
+    day = time.strftime("%Y-%m-%d", time.gmtime())
+    with _lock:
+        conn = _get_conn()
+        conn.executemany(
+            "INSERT INTO queries VALUES (?, ?, 1) ON CONFLICT(day, ticker) DO UPDATE SET count = count + 1",
+            [(day, ticker.upper()) for ticker in tickers],
+        )
+        conn.commit()
+
+
+def most_queried(n: int = None, days: int = None) -> list:
+    """Returns the `n` tickers asked about most over the last `days` days."""
+    n = HISTORY_TOP if n is None else n
+    since = time.strftime("%Y-%m-%d", time.gmtime(time.time() - (days or HISTORY_DAYS) * 86400))
+    with _lock:
+        rows = _get_conn().execute(
+            "SELECT ticker FROM queries WHERE day >= ? GROUP BY ticker ORDER BY SUM(count) DESC, ticker LIMIT ?",
+            (since, n),
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def watchlist() -> list:
+    """The configured tickers first, then the most asked ones, without repeats or unlisted tickers."""
+    tickers = WATCHLIST.split(",")
+    if os.path.exists(WATCHLIST_FILE):
+        with open(WATCHLIST_FILE) as f:
+            tickers += [line.split("#")[0] for line in f]
+    tickers += most_queried()
+
+    unique = []
+    for ticker in tickers:
+        ticker = ticker.strip().upper()
+        if ticker and ticker not in unique and (symbols.is_valid(ticker) or not symbols.available()):
+            unique.append(ticker)
+    return unique
+
+
+def _timezone():
+    try:
+        return ZoneInfo(TIMEZONE)
+    except Exception:  # No tz database on this system
+        print(f"Prewarm: time zone {TIMEZONE} unavailable, scheduling in UTC")
+        return timezone.utc
+
+
+def next_run(now: datetime = None) -> datetime:
+    """The next scheduled run after `now`, skipping weekends when WEEKDAYS_ONLY."""
+    now = now or datetime.now(_timezone())
+    hour, minute = (int(part) for part in PREWARM_AT.split(":"))
+    run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run <= now:
+        run += timedelta(days=1)
+    while WEEKDAYS_ONLY and run.weekday() >= 5:
+        run += timedelta(days=1)
+    return run
+
+
+def trigger() -> asyncio.Task:
+    """Starts a run now unless one is in progress, and returns it. Must be called from the event loop."""
+    global _running
+    if _running is None:
+        _running = asyncio.create_task(_run())
+        _running.add_done_callback(_finished)
+    return _running
+
+
+def _finished(task):
+    global _running
+    _running = None
+
+
+async def run() -> dict:
+    """
+    Builds or updates the index of every watchlist ticker not yet built today and returns a summary.
+    A run already in progress is joined instead of starting another.
+    """
+    return await asyncio.shield(trigger())
+
+
+def _plan() -> tuple:
+    """Returns the watchlist, its tickers not built today and the Alpha Vantage calls left. Reads files and databases."""
+    tickers = watchlist()
+    return tickers, [t for t in tickers if not index_builder.built_today(t)], alpha_vantage.remaining_calls()
+
+
+async def _run() -> dict:
+    """
+    Tickers beyond what the remaining Alpha Vantage quota allows are skipped, and builds are
+    started no faster than the per-minute rate so interactive calls never queue behind them.
+    """
+    global _last_run
+    started = time.time()
+    tickers, stale, remaining = await run_blocking(cpu_executor, _plan)
+    affordable = max((remaining - RESERVE_CALLS) // CALLS_PER_TICKER, 0)
+    todo, over_quota = stale[:affordable], stale[affordable:]
+    interval = 60 * CALLS_PER_TICKER / alpha_vantage.CALLS_PER_MINUTE
+    slots = asyncio.Semaphore(CONCURRENCY)
+
+    async def warm(position, ticker):
+        await asyncio.sleep(position * interval)
+        async with slots:
+            job = await build_jobs.wait(build_jobs.submit(ticker)["job_id"])
+            await alpha_vantage.get_overview_async(ticker)  # Cached for the day's questions
+        return ticker, (job["result"] if job else {"error": "Build job was pruned"})
+
+    results = dict(await asyncio.gather(*[warm(position, t) for position, t in enumerate(todo)]))
+    _last_run = {
+        "started_at": started,
+        "seconds": round(time.time() - started, 1),
+        "watchlist": tickers,
+        "built": [t for t, result in results.items() if "error" not in result],
+        "failed": {t: result["error"] for t, result in results.items() if "error" in result},
+        "already_warm": [t for t in tickers if t not in stale],
+        "skipped_for_quota": over_quota,
+    }
+    print(f"Prewarm: built {len(_last_run['built'])}, failed {len(_last_run['failed'])}, "
+          f"already warm {len(_last_run['already_warm'])}, skipped for quota {len(over_quota)}")
+    return _last_run
+
+
+async def _schedule():
+    while True:
+        wake = next_run()
+        print(f"Prewarm: next run at {wake.isoformat()}")
+        await asyncio.sleep(max((wake - datetime.now(wake.tzinfo)).total_seconds(), 0))
+        try:
+            await run()
+        except Exception as e:
+            print(f"Prewarm failed: {e}")
+
+
+def start():
+    """Starts the daily schedule. Must be called from the event loop."""
+    global _task
+    if PREWARM_ENABLED and _task is None:
+        _task = asyncio.create_task(_schedule())
+
+
+def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
+
+
+def status() -> dict:
+    """Returns the watchlist, the next scheduled run and the summary of the last one."""
+    return {
+        "enabled": PREWARM_ENABLED,
+        "running": _running is not None,
+        "watchlist": watchlist(),
+        "next_run": next_run().isoformat() if _task is not None else None,
+        "last_run": _last_run,
+        "calls_left_today": alpha_vantage.remaining_calls(),
+    }
+
+
+if __name__ == "__main__":
+    # One run now, e.g. from cron; --data-dir points at another store such as streamlit/data
+    parser = argparse.ArgumentParser(description="Build today's indexes for the prewarm watchlist.")
+    parser.add_argument("--data-dir", help="Data folder holding indexes/ and the cache databases")
+    args = parser.parse_args()
+    if args.data_dir:
+        index_store.INDEX_ROOT = os.path.join(args.data_dir, "indexes")
+        alpha_vantage.CACHE_FILE = os.path.join(args.data_dir, "alpha_vantage_cache.db")
+        article_cache.CACHE_FILE = os.path.join(args.data_dir, "article_cache.db")
+        HISTORY_FILE = os.path.join(args.data_dir, "query_history.db")
+        WATCHLIST_FILE = os.path.join(args.data_dir, "watchlist.txt")
+    print(asyncio.run(run()))
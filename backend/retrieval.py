@@ -0,0 +1,151 @@
+import heapq
+import os
+import dedup
+import embeddings
+import index_cache
+import index_store
+import lexical_index
+import metrics
+from concurrency import shard_executor
+
+# Dense search alone misses exact tokens (tickers, quarters, figures); with hybrid search
+# on, the top candidates of FAISS and BM25 are fused by reciprocal rank.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") != "0"
+CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", 30))
+RRF_K = int(os.getenv("RRF_K", 60))
+# Metadata filters are applied to each shard's candidates, so filtered searches read deeper
+FILTER_DEPTH = int(os.getenv("RETRIEVAL_FILTER_DEPTH", 4))
+
+
+def dense_search(index, user_query: str, k: int) -> list:
+    """Returns the ids of the k nearest chunks to the query embedding, best first."""
+    # Cached by normalized question; misses are micro-batched with concurrent requests
+    with metrics.timer("query_embed"):
+        query_vector = embeddings.encode_query(user_query)
+    with metrics.timer("search"):
+        _, indices = index.search(query_vector, k=k)
+    return [int(i) for i in indices[0] if i >= 0]  # -1 pads missing results
+
+
+def search(index, lexical, user_query: str, k: int = 10) -> list:
+    """
+    Returns the ids of the top-k chunks for the query, best first.
+    Uses dense search only when there is no BM25 index (older versions) or HYBRID_SEARCH is off.
+    """
+    if lexical is None or not HYBRID_SEARCH:
+        return dense_search(index, user_query, k)
+
+    depth = max(k, CANDIDATES)
+    dense_ids = dense_search(index, user_query, depth)
+    with metrics.timer("lexical_search"):
+        lexical_ids, _ = lexical.search(user_query, depth)
+    return lexical_index.reciprocal_rank_fusion([dense_ids, lexical_ids.tolist()], k, RRF_K)
+
+
+def fetch_chunks(processed_chunks, ids) -> list:
+    """Looks up chunks by id, skipping ids out of range and chunks removed by incremental updates."""
+    chunks = [processed_chunks[i] for i in ids if 0 <= i < len(processed_chunks)]
+    return [chunk for chunk in chunks if chunk is not None]
+
+
+def load_shard(ticker: str, version: str) -> tuple:
+    """Returns (index, chunks, lexical) of one ticker's index version, loading it into the index cache if needed."""
+    def load():
+        with metrics.timer("load"):
+            index, processed_chunks, _ = index_store.load_version(ticker, version)  # Memory-mapped, shared across workers
+            return index, processed_chunks, index_store.load_lexical(ticker, version)
+
+    return index_cache.get_or_load(ticker, version, load)
+
+
+def _date_bound(value):
+    """Accepts YYYY-MM-DD or YYYYMMDD (optionally with a time) and returns it in the published format's prefix form."""
+    return value.replace("-", "").replace(":", "") if value else None
+
+
+def matches(chunk: dict, start: str = None, end: str = None, source: str = None) -> bool:
+    """
+    True if the chunk was published within [start, end] (inclusive dates) and, when `source`
+    is given, one of its URLs contains it (e.g. "reuters.com").
+    """
+    published = chunk.get("published") or ""
+    if start and published < start:
+        return False
+    if end and published[:len(end)] > end:
+        return False
+    if source and not any(source in url for url in dedup.chunk_sources(chunk)):
+        return False
+    return True
+
+
+def _search_shard(ticker, version, query_vector, user_query, depth, filters):
+    """Dense and BM25 candidates of one shard as (score, ticker, id), keeping those that pass the filters."""
+    index, processed_chunks, lexical = load_shard(ticker, version)
+    distances, indices = index.search(query_vector, k=depth)
+    # Unit vectors: squared L2 = 2 - 2 cos, so scores are cosine similarities comparable across shards
+    dense = [(1.0 - float(d) / 2, ticker, int(i)) for d, i in zip(distances[0], indices[0]) if i >= 0]
+
+    lexical_hits = []
+    if lexical is not None and HYBRID_SEARCH:
+        ids, scores = lexical.search(user_query, depth)
+        lexical_hits = [(score, ticker, i) for score, i in zip(scores.tolist(), ids.tolist())]
+
+    if any(filters.values()):
+        passed = {i for i in {i for _, _, i in dense + lexical_hits} if _passes(processed_chunks, i, filters)}
+        dense = [hit for hit in dense if hit[2] in passed]
+        lexical_hits = [hit for hit in lexical_hits if hit[2] in passed]
+    return dense, lexical_hits
+
+
+def _passes(processed_chunks, i, filters) -> bool:
+    chunk = processed_chunks[i] if 0 <= i < len(processed_chunks) else None
+    return chunk is not None and matches(chunk, **filters)
+
+
+def _hit(shard, ticker, i, score) -> dict:
+    index, processed_chunks, _ = shard
+    chunk = processed_chunks[i] if 0 <= i < len(processed_chunks) else None
+    if chunk is None:
+        return None  # Removed by an incremental update
+    try:
+        vector = index.reconstruct(i)
+    except RuntimeError:
+        vector = None  # The index can't reconstruct (e.g. no direct map); selection then ranks by relevance only
+    return {"ticker": ticker, "id": i, "score": score, "chunk": dict(chunk, ticker=ticker), "vector": vector}
+
+
+def search_shards(versions: dict, user_query: str, k: int = 10, start: str = None, end: str = None, source: str = None) -> list:
+    """
+    Searches the per-ticker shards in `versions` (ticker -> pinned index version) in parallel and
+    merges their results. The query is embedded once; each shard returns the ids and scores of its
+    best candidates that pass the date range and source filters. Dense candidates merge by cosine
+    similarity, BM25 candidates by score, and the two global rankings are fused by reciprocal rank.
+    Only the final top-k chunks are read from the chunk stores.
+    Returns up to k hits, best first, as {"ticker", "id", "score", "chunk", "vector"}.
+    """
+    if not versions:
+        return []
+    filters = {"start": _date_bound(start), "end": _date_bound(end), "source": source}
+    depth = max(k, CANDIDATES) * (FILTER_DEPTH if any(filters.values()) else 1)
+
+    with metrics.timer("query_embed"):
+        query_vector = embeddings.encode_query(user_query)
+    # Shards search concurrently (FAISS releases the GIL), so latency tracks the slowest shard, not their count
+    with metrics.timer("search"):
+        futures = [
+            shard_executor.submit(_search_shard, ticker, version, query_vector, user_query, depth, filters)
+            for ticker, version in versions.items()
+        ]
+        results = [future.result() for future in futures]
+
+    dense = heapq.nlargest(depth, (hit for shard_dense, _ in results for hit in shard_dense))
+    lexical_hits = heapq.nlargest(depth, (hit for _, shard_lexical in results for hit in shard_lexical))
+    dense_keys = [(ticker, i) for _, ticker, i in dense]
+    if lexical_hits:
+        keys = lexical_index.reciprocal_rank_fusion([dense_keys, [(t, i) for _, t, i in lexical_hits]], k, RRF_K)
+    else:
+        keys = dense_keys[:k]
+
+    dense_scores = {(ticker, i): score for score, ticker, i in dense}
+    hits = [_hit(load_shard(ticker, versions[ticker]), ticker, i, dense_scores.get((ticker, i))) for ticker, i in keys]
+    return [hit for hit in hits if hit is not None]
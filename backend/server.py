@@ -1,15 +1,45 @@
 from fastapi import FastAPI, Query
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import index_builder
-from call_llm import query_llm_with_retrieval
-import time
+from call_llm import stream_llm_with_retrieval, pin_versions
+from contextlib import asynccontextmanager
+import model_registry
+import index_cache
+import article_cache
+import embeddings
+import alpha_vantage
+import answer_cache
+import context_builder
+import metrics
+import dedup
+import retrieval
+from concurrency import close_http_client, cpu_executor, run_blocking
+import build_jobs
+import prewarm
+import symbols
 import uvicorn
 import os
 
 os.makedirs("data", exist_ok=True)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedding model once, before the first request arrives
+    model_registry.warm_up()
+    # Read the ticker listing now rather than on the first request
+    symbols.available()
+    index_builder.adopt_legacy_index()
+    # Rebuild the watchlist's indexes every morning before market open
+    prewarm.start()
+    yield
+    prewarm.stop()
+    await build_jobs.shutdown()
+    await close_http_client()
+    # Worker processes of the embedding pool (EMBED_PROCESSES > 1)
+    embeddings.stop_pools()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -21,35 +51,185 @@ app.add_middleware(
 )
 
 @app.get("/build-index/")
-async def build_index(ticker: str = Query(..., description="Stock ticker symbol")):
+async def build_index(ticker: str = Query(..., description="Stock ticker symbol"),
+                      full: bool = Query(False, description="Rebuild from scratch instead of updating the existing index")):
+    """
+    API to queue a news fetch and index build for a ticker.
+    Returns the build job at once; poll /build-status/{job_id} for progress.
+    Requests for a ticker that is already being built share the running job.
+    """
+    # Unknown tickers are rejected before spending Alpha Vantage quota on them
+    if not await run_blocking(cpu_executor, is_known_ticker, ticker):
+        return JSONResponse(content={"error": "Invalid ticker symbol. Please enter a valid stock ticker."}, status_code=400)
+    job = build_jobs.submit(ticker, full)
+    return JSONResponse(content=job, status_code=202)
+
+@app.get("/symbols/")
+async def search_symbols(q: str = Query(..., description="Ticker or company name prefix"),
+                         limit: int = Query(10, ge=1, le=50, description="Number of suggestions")):
+    """
+    API to autocomplete tickers and company names from the listing file.
+    """
+    # The listing is re-read when its file changes
+    return JSONResponse(content=await run_blocking(cpu_executor, symbols.complete, q, limit))
+
+@app.get("/prewarm/")
+async def start_prewarm():
+    """
+    API to rebuild the watchlist's indexes now instead of waiting for the morning run.
+    Returns at once; poll /prewarm-status/ for the summary.
+    """
+    prewarm.trigger()
+    return JSONResponse(content=await run_blocking(cpu_executor, prewarm.status), status_code=202)
+
+@app.get("/prewarm-status/")
+async def prewarm_status():
+    """
+    API to report the prewarm watchlist, the next scheduled run and what the last run built.
     """
-    API to fetch stock news and build an index.
+    return JSONResponse(content=await run_blocking(cpu_executor, prewarm.status))
+
+@app.get("/build-status/{job_id}")
+async def build_status(job_id: str):
     """
-    response = index_builder.build_stock_index(ticker)
-    # return response
-    return JSONResponse(content=response)
+    API to report the status, current stage and result of a build job.
+    """
+    job = build_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": f"Unknown job {job_id}"}, status_code=404)
+    return JSONResponse(content=job)
+
+@app.get("/build-jobs/")
+async def list_build_jobs():
+    """
+    API to list queued, running and recently finished build jobs.
+    """
+    return JSONResponse(content=build_jobs.list_jobs())
+
+def is_known_ticker(ticker):
+    """Whether `ticker` is listed, or True when there is no listing file to check against."""
+    return not symbols.available() or symbols.is_valid(ticker)
+
+def record_query(ticker):
+    """Counts a question about the indexed tickers among `ticker` in the prewarm query history."""
+    versions, _ = pin_versions(ticker)
+    prewarm.record_query(list(versions))
+
+def news_filters(start, end, source):
+    """The news filters given on a request, without the unset ones."""
+    filters = {"start": start, "end": end, "source": source}
+    return {name: value for name, value in filters.items() if value}
 
 @app.get("/ask/")
-async def ask_question(ticker: str = Query(..., description="Stock ticker symbol"),
-                       question: str = Query(..., description="User research question")):
+async def ask_question(ticker: str = Query(..., description="Stock ticker symbol, a comma-separated list, or * for all indexed tickers"),
+                       question: str = Query(..., description="User research question"),
+                       start: str = Query(None, description="Only use news published on or after this date (YYYY-MM-DD)"),
+                       end: str = Query(None, description="Only use news published on or before this date (YYYY-MM-DD)"),
+                       source: str = Query(None, description="Only use news whose URL contains this, e.g. reuters.com")):
     """
     API to process financial research queries.
     Calls LLM retrieval function and streams back the response.
     """
+    filters = news_filters(start, end, source)
+    if ticker.strip() != "*":
+        # Tickers people ask about are prewarmed the next morning
+        await run_blocking(cpu_executor, record_query, ticker)
 
     async def generate_response():
         # yield f"Retrieving data for {ticker}...\n\n"
 
-        # Call LLM function
-        llm_response = query_llm_with_retrieval(ticker, question)
-
-        # Stream response word by word
-        for word in llm_response.split():
-            yield word + " "
-            time.sleep(0.05)  # Simulate streaming delay
+        # Forward tokens to the client as the LLM generates them; stage times are logged per request
+        with metrics.trace("ask", ticker=ticker.upper()):
+            metrics.count("questions")
+            async for token in stream_llm_with_retrieval(ticker, question, filters):
+                yield token
 
     return StreamingResponse(generate_response(), media_type="text/plain")
 
+@app.get("/search/")
+async def search_news(q: str = Query(..., description="Search query"),
+                      tickers: str = Query("*", description="Comma-separated tickers to search, or * for all indexed tickers"),
+                      k: int = Query(10, ge=1, le=100, description="Number of results"),
+                      start: str = Query(None, description="Only news published on or after this date (YYYY-MM-DD)"),
+                      end: str = Query(None, description="Only news published on or before this date (YYYY-MM-DD)"),
+                      source: str = Query(None, description="Only news whose URL contains this, e.g. reuters.com")):
+    """
+    API to search the news of several tickers at once.
+    Each ticker's index is searched in parallel and the results are merged into one ranking.
+    """
+    versions, missing = await run_blocking(cpu_executor, pin_versions, tickers)
+    if not versions:
+        return JSONResponse(content={"error": f"No index found for {tickers}. Please build the index first."}, status_code=404)
+
+    with metrics.trace("search", tickers=len(versions)):
+        hits = await run_blocking(cpu_executor, retrieval.search_shards, versions, q, k, **news_filters(start, end, source))
+    return JSONResponse(content={
+        "results": [
+            {
+                "ticker": hit["ticker"],
+                "score": hit["score"],
+                "text": hit["chunk"]["text"],
+                "sources": dedup.chunk_sources(hit["chunk"]),
+                "published": hit["chunk"].get("published"),
+            }
+            for hit in hits
+        ],
+        "missing": missing,
+    })
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    API to expose per-stage latency histograms, event counters and cache gauges in the Prometheus text format.
+    """
+    caches = {
+        "index_cache": index_cache.cache_stats(),
+        "query_cache": embeddings.query_cache_stats(),
+        "answer_cache": answer_cache.cache_stats(),
+        "alpha_vantage": await run_blocking(cpu_executor, alpha_vantage.client_stats),
+    }
+    gauges = {
+        "cache": {
+            (("cache", cache), ("stat", stat)): value
+            for cache, stats in caches.items()
+            for stat, value in stats.items()
+            if isinstance(value, (int, float))
+        },
+        "build_jobs": {
+            (("status", status),): sum(job["status"] == status for job in build_jobs.list_jobs())
+            for status in ("queued", "running", "done", "failed")
+        },
+    }
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+@app.get("/model-stats/")
+async def model_stats():
+    """
+    API to report load time and memory use of the loaded embedding models.
+    """
+    return JSONResponse(content=model_registry.registry_stats())
+
+@app.get("/prompt-stats/")
+async def prompt_stats():
+    """
+    API to report prompt token counts against the context budget.
+    """
+    return JSONResponse(content=context_builder.context_stats())
+
+@app.get("/cache-stats/")
+async def cache_stats():
+    """
+    API to report hit and miss counts of the index, query, answer and Alpha Vantage caches and the size of the article cache.
+    """
+    return JSONResponse(content={
+        "index_cache": index_cache.cache_stats(),
+        "article_cache": await run_blocking(cpu_executor, article_cache.cache_stats),
+        "query_cache": embeddings.query_cache_stats(),
+        "answer_cache": answer_cache.cache_stats(),
+        "alpha_vantage": await run_blocking(cpu_executor, alpha_vantage.client_stats),
+    })
+
+# Prefer `uvicorn server:app`: the spawned HTML parse workers re-run this script's imports
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000)) 
     uvicorn.run(app, host="0.0.0.0", port=port)
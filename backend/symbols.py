@@ -0,0 +1,120 @@
+import bisect
+import csv
+import os
+import re
+import threading
+import time
+
+# Alpha Vantage LISTING_STATUS symbols, loaded once into sorted arrays for constant-time
+# validation and bisect-based prefix search of symbols and company-name words. The file
+# is re-read only when its modification time changes.
+LISTING_FILE = os.getenv(
+    "LISTING_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "streamlit", "data", "listing_status.csv"),
+)
+# How often, in seconds, the file's modification time is checked
+RECHECK_SECONDS = float(os.getenv("LISTING_RECHECK_SECONDS", 5))
+
+_lock = threading.Lock()
+_listing = None  # Loaded listing, replaced whole on reload so readers never see a partial one
+_checked = {"at": float("-inf"), "mtime": None}
+
+
+def _load(path: str) -> dict:
+    """Reads the listing CSV into sorted symbol and name-word arrays."""
+    rows = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            symbol = (row.get("symbol") or "").strip().upper()
+            if symbol:
+                rows[symbol] = (row.get("name") or "", row.get("exchange") or "", row.get("assetType") or "")
+
+    symbols = sorted(rows)
+    positions = {symbol: i for i, symbol in enumerate(symbols)}
+    # Every word of every company name, so "micro" finds Microsoft and Advanced Micro Devices
+    words = sorted(
+        (word, positions[symbol])
+        for symbol, (name, _, _) in rows.items()
+        for word in set(re.findall(r"[a-z0-9]+", name.lower()))
+    )
+    return {
+        "symbols": symbols,
+        "details": [rows[symbol] for symbol in symbols],
+        "positions": positions,
+        "words": [word for word, _ in words],
+        "word_symbols": [i for _, i in words],
+    }
+
+
+def _get() -> dict:
+    """Returns the loaded listing, (re)loading it when the file is new or changed, or None without one."""
+    global _listing
+    now = time.monotonic()
+    if now - _checked["at"] < RECHECK_SECONDS:
+        return _listing
+
+    with _lock:
+        _checked["at"] = now
+        try:
+            mtime = os.stat(LISTING_FILE).st_mtime
+        except OSError:
+            return _listing  # Keep serving the last listing if the file is briefly missing
+        if mtime != _checked["mtime"]:
+            start = time.perf_counter()
+            _listing = _load(LISTING_FILE)
+            _checked["mtime"] = mtime
+            print(f"Loaded {len(_listing['symbols'])} symbols in {time.perf_counter() - start:.2f}s")
+    return _listing
+
+
+def available() -> bool:
+    """Whether a listing file was found."""
+    return _get() is not None
+
+
+def is_valid(symbol: str) -> bool:
+    """Whether `symbol` is a listed ticker."""
+    listing = _get()
+    return listing is not None and symbol.strip().upper() in listing["positions"]
+
+
+def _entry(listing: dict, i: int) -> dict:
+    name, exchange, asset_type = listing["details"][i]
+    return {"symbol": listing["symbols"][i], "name": name, "exchange": exchange, "assetType": asset_type}
+
+
+def lookup(symbol: str) -> dict:
+    """Returns the symbol, name, exchange and asset type of a listed ticker, or None."""
+    listing = _get()
+    i = listing["positions"].get(symbol.strip().upper()) if listing is not None else None
+    return _entry(listing, i) if i is not None else None
+
+
+def _prefix_range(keys: list, prefix: str) -> range:
+    """Positions of the sorted `keys` that start with `prefix`."""
+    start = bisect.bisect_left(keys, prefix)
+    return range(start, bisect.bisect_left(keys, prefix + "\uffff", lo=start))
+
+
+def complete(prefix: str, limit: int = 10) -> list:
+    """
+    Suggests up to `limit` listings for what the user typed: an exact symbol first, then symbols
+    starting with it (shortest first), then companies with a name word starting with it
+    (stocks before ETFs, shorter names first). A query of several words must appear in the name as typed.
+    """
+    listing = _get()
+    query = prefix.strip()
+    if listing is None or not query:
+        return []
+
+    symbols = sorted(_prefix_range(listing["symbols"], query.upper()), key=lambda i: (len(listing["symbols"][i]), i))
+    picked = symbols[:limit]
+    if len(picked) < limit:
+        words = query.lower().split()
+        names = {listing["word_symbols"][w] for w in _prefix_range(listing["words"], words[0])} - set(picked)
+        if len(words) > 1:
+            names = {i for i in names if query.lower() in listing["details"][i][0].lower()}
+        details = listing["details"]
+        picked += sorted(names, key=lambda i: (details[i][2] != "Stock", len(details[i][0]), i))[:limit - len(picked)]
+    return [_entry(listing, i) for i in picked]
+
@@ -1,37 +1,20 @@
-import requests
-from datetime import datetime, timedelta
-import os
-from dotenv import load_dotenv
+import sys
+import alpha_vantage
 
-load_dotenv()
-API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
+# Goes through the shared client, so it can be pointed at the local fake server:
+#   python -m bench.stub_upstreams --port 9000 &
+#   ALPHA_VANTAGE_URL=http://localhost:9000/query python test.py AAPL
 
-def get_alpha_vantage_news(api_key, ticker, topic=None):
+def get_alpha_vantage_news(ticker, topic=None):
     """
     Fetches news articles about `ticker` from the Alpha Vantage News API.
     Optionally filters by `topic` (e.g., "technology", "finance", etc.).
     Returns a list of dicts with article info (title, summary, sentiment, etc.).
     """
 
-    # Alpha Vantage 'NEWS_SENTIMENT' endpoint
-    url = "https://www.alphavantage.co/query"
-
-    # Base params
-    params = {
-        "function": "NEWS_SENTIMENT",
-        "tickers": ticker,
-        "apikey": api_key
-    }
-
-    # If a topic was provided, include it in the params
     # NOTE: The Alpha Vantage parameter for filtering by topic is "topics".
     # E.g., topics=technology,ipo
-    if topic:
-        params["topics"] = topic
-
-    response = requests.get(url, params=params)
-    print("Request URL:", response.url)  # Debugging: see the final request
-    data = response.json()
+    data = alpha_vantage.get_news(ticker, sort="LATEST", topics=topic)
 
     # Check for errors
     if "feed" not in data:
@@ -41,8 +24,8 @@ def get_alpha_vantage_news(api_key, ticker, topic=None):
     articles = data["feed"]
     return articles
 
-ticker = "AAPL"
-articles = get_alpha_vantage_news(API_KEY, ticker)
+ticker = sys.argv[1].upper() if len(sys.argv) > 1 else "AAPL"
+articles = get_alpha_vantage_news(ticker)
 limit = 5
 articles = articles[:limit]
 
@@ -53,4 +36,6 @@ for i, article in enumerate(articles, start=1):
 
     print(f"\nArticle {i}:")
     print(f"Title: {title}")
-    print(f"Summary: {summary[:200]}...")  # limit summary preview
\ No newline at end of file
+    print(f"Summary: {summary[:200]}...")  # limit summary preview
+
+print(f"\nClient stats: {alpha_vantage.client_stats()}")
\ No newline at end of file
@@ -0,0 +1,44 @@
+import os
+import sys
+import threading
+import time
+import pytest
+import uvicorn
+
+# Tests import backend modules the way the server does, as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import stub_upstreams  # noqa: E402
+import alpha_vantage  # noqa: E402
+
+STUB_PORT = int(os.getenv("TEST_STUB_PORT", 9271))
+
+
+@pytest.fixture(scope="session")
+def stub():
+    """Runs bench.stub_upstreams on a background thread and returns its base URL."""
+    server = uvicorn.Server(uvicorn.Config(stub_upstreams.app, host="127.0.0.1", port=STUB_PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    yield f"http://127.0.0.1:{STUB_PORT}"
+    server.should_exit = True
+    thread.join()
+
+
+@pytest.fixture
+def av(stub, tmp_path, monkeypatch):
+    """The Alpha Vantage client pointed at the stub, with an empty cache and a fresh quota."""
+    monkeypatch.setattr(alpha_vantage, "BASE_URL", f"{stub}/query")
+    monkeypatch.setattr(alpha_vantage, "CACHE_FILE", str(tmp_path / "alpha_vantage_cache.db"))
+    monkeypatch.setattr(alpha_vantage, "CALLS_PER_MINUTE", 1000.0)
+    monkeypatch.setattr(alpha_vantage, "_conn", None)
+    monkeypatch.setattr(alpha_vantage, "_inflight", {})
+    monkeypatch.setattr(alpha_vantage, "_bucket", {"tokens": 1000.0, "updated": time.monotonic()})
+    monkeypatch.setattr(alpha_vantage, "_stats", dict.fromkeys(alpha_vantage._stats, 0))
+    stub_upstreams.av_calls.clear()
+    yield alpha_vantage
+    if alpha_vantage._conn is not None:
+        alpha_vantage._conn.close()
+
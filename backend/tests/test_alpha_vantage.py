@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from bench import stub_upstreams
+
+
+def upstream_calls(stub, function) -> int:
+    """Alpha Vantage calls of `function` the stub has received."""
+    return httpx.get(f"{stub}/stub-stats").json()["alpha_vantage_calls"].get(function, 0)
+
+
+def test_cache_hit_makes_no_upstream_call(stub, av):
+    first = av.get_overview("AAPL")
+    assert first["Symbol"] == "AAPL"
+    assert upstream_calls(stub, "OVERVIEW") == 1
+
+    assert av.get_overview("aapl") == first
+    assert upstream_calls(stub, "OVERVIEW") == 1
+    assert av.client_stats()["hits"] == 1
+
+
+def test_concurrent_identical_requests_share_one_call(stub, av, monkeypatch):
+    # Slow upstream, so every request arrives while the first call is in flight
+    monkeypatch.setattr(stub_upstreams, "ALPHA_VANTAGE_DELAY", 0.5)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(av.get_news, ["MSFT"] * 8))
+
+    assert upstream_calls(stub, "NEWS_SENTIMENT") == 1
+    assert all(result == results[0] and "feed" in result for result in results)
+    assert av.client_stats()["merged"] == 7
+
+
+def test_exhausted_quota_serves_stale_data(stub, av, monkeypatch):
+    monkeypatch.setattr(av, "CALLS_PER_DAY", 1)
+    fresh = av.get_overview("AAPL")
+    assert av.remaining_calls() == 0
+
+    # A zero TTL treats the cached answer as expired; with no quota left it is still served
+    stale = av.query(av.overview_params("AAPL"), ttl=0)
+    assert stale == fresh
+    assert upstream_calls(stub, "OVERVIEW") == 1
+    assert av.client_stats()["stale"] == 1
+
+    # Nothing cached to fall back on
+    assert "error" in av.get_overview("MSFT")
+    assert upstream_calls(stub, "OVERVIEW") == 1
@@ -0,0 +1,39 @@
+from collections import OrderedDict
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")  # answer_cache imports the encoder through embeddings
+
+import answer_cache  # noqa: E402
+import embeddings  # noqa: E402
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """An empty answer cache where every question embeds to the same vector, so any two are semantically equal."""
+    monkeypatch.setattr(answer_cache, "_entries", OrderedDict())
+    monkeypatch.setattr(answer_cache, "_stats", {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "saved_seconds": 0.0})
+    monkeypatch.setattr(embeddings, "encode_query", lambda text: np.ones((1, 4), dtype=np.float32) / 2)
+    return answer_cache
+
+
+def test_paraphrase_with_the_same_numbers_is_a_semantic_hit(cache):
+    cache.put("AAPL", "v000001", "What was AAPL revenue in Q3 2024?", "About $85B.", 2.0)
+
+    assert cache.lookup("AAPL", "v000001", "what was aapl revenue in q3 2024") == "About $85B."
+    assert cache.lookup("AAPL", "v000001", "How much revenue did AAPL make in Q3 2024?") == "About $85B."
+    assert cache.cache_stats()["exact_hits"] == 1
+    assert cache.cache_stats()["semantic_hits"] == 1
+
+
+@pytest.mark.parametrize("question", [
+    "What was AAPL revenue in Q4 2024?",
+    "What was AAPL revenue in Q3 2023?",
+    "What was MSFT revenue in Q3 2024?",
+    "What was AAPL revenue?",
+])
+def test_question_about_another_period_or_ticker_misses(cache, question):
+    cache.put("AAPL,MSFT", "v000001", "What was AAPL revenue in Q3 2024?", "About $85B.", 2.0)
+
+    assert cache.lookup("AAPL,MSFT", "v000001", question) is None
+    assert cache.cache_stats()["semantic_hits"] == 0
@@ -0,0 +1,114 @@
+import zlib
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("sentence_transformers")
+
+from langchain_core.documents import Document  # noqa: E402
+import article_cache  # noqa: E402
+import article_fetcher  # noqa: E402
+import embeddings  # noqa: E402
+import index_builder  # noqa: E402
+import index_store  # noqa: E402
+
+DIM = 8
+
+PAGES = {
+    f"https://news.example.com/{name}": (
+        f"{company} reported {name} results on Tuesday. Revenue for the quarter came in at {revenue} billion dollars, "
+        f"ahead of analyst estimates, while margins held steady and the company kept its guidance for the year unchanged. "
+        f"Executives said demand for {product} stayed strong across regions and that supply constraints had eased."
+    )
+    for name, company, revenue, product in [
+        ("old", "Apple", "81.8", "the iPhone"),
+        ("fresh", "Apple", "85.8", "services"),
+        ("next", "Apple", "94.9", "wearables"),
+    ]
+}
+# A syndicated copy of the fresh story: same words, different bytes
+PAGES["https://wire.example.com/fresh"] = PAGES["https://news.example.com/fresh"].replace(". ", ".  ")
+
+
+def published(days_ago: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days_ago)).strftime(index_builder.PUBLISHED_FORMAT)
+
+
+def article(url: str, days_ago: float = 0) -> dict:
+    return {"url": url, "time_published": published(days_ago)}
+
+
+class FakeEncoder:
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+
+def fake_encode(texts, *args, **kwargs):
+    """Deterministic unit vectors, one per text."""
+    vectors = np.vstack([np.random.default_rng(zlib.crc32(text.encode("utf-8"))).random(DIM) for text in texts])
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture
+def fetched(monkeypatch, tmp_path):
+    """Points index_builder at `tmp_path`, fake embeddings and PAGES. Returns the URLs it fetches."""
+    monkeypatch.setattr(index_store, "INDEX_ROOT", str(tmp_path / "indexes"))
+    monkeypatch.setattr(article_cache, "CACHE_FILE", str(tmp_path / "article_cache.db"))
+    monkeypatch.setattr(article_cache, "_conn", None)
+    monkeypatch.setattr(embeddings, "encode", fake_encode)
+    monkeypatch.setattr(index_builder, "get_encoder", lambda *args: FakeEncoder())
+    fetched = []
+
+    def iter_articles(urls, tally=None):
+        for url in urls:
+            fetched.append(url)
+            yield url, Document(page_content=PAGES[url], metadata={"source": url}), None
+
+    monkeypatch.setattr(article_fetcher, "iter_articles", iter_articles)
+    return fetched
+
+
+def test_unchanged_news_keeps_the_current_version(fetched):
+    news = [article("https://news.example.com/fresh")]
+    built = index_builder.build_stock_index("AAPL", incremental=False, news=news)
+
+    refreshed = index_builder.build_stock_index("AAPL", news=news)
+
+    assert refreshed["version"] == built["version"]
+    assert refreshed["added"] == refreshed["removed"] == 0
+    assert "already up to date" in refreshed["message"]
+    assert index_store.load_meta_version("AAPL", built["version"])["checked_at"]
+    assert index_builder.built_today("AAPL")
+
+
+def test_old_articles_are_removed_by_id_and_new_ones_appended(fetched):
+    old, fresh, new = (f"https://news.example.com/{name}" for name in ("old", "fresh", "next"))
+    index_builder.build_stock_index("AAPL", incremental=False, news=[article(old, days_ago=30), article(fresh)])
+    fetched.clear()
+
+    updated = index_builder.build_stock_index("AAPL", news=[article(fresh), article(new)])
+
+    assert (updated["added"], updated["removed"]) == (1, 1)
+    assert fetched == [new]  # Indexed articles are not fetched again
+    index, store, _ = index_store.load_version("AAPL", updated["version"])
+    # Ids stay stable: the old article's slot is emptied, the new article gets the next id
+    assert [chunk and chunk["source"] for chunk in store] == [None, fresh, new]
+    assert index.ntotal == 2
+    _, ids = index.search(fake_encode([PAGES[new]]), 1)
+    assert ids[0][0] == 2
+
+
+def test_copy_of_an_indexed_story_is_merged_without_encoding(fetched, monkeypatch):
+    fresh, copy = "https://news.example.com/fresh", "https://wire.example.com/fresh"
+    built = index_builder.build_stock_index("AAPL", incremental=False, news=[article(fresh)])
+    encoded = []
+    monkeypatch.setattr(embeddings, "encode", lambda texts, *args, **kwargs: encoded.extend(texts) or fake_encode(texts))
+
+    updated = index_builder.build_stock_index("AAPL", news=[article(fresh), article(copy)])
+
+    assert updated["version"] != built["version"]
+    assert updated["added"] == 0
+    assert encoded == []
+    _, store, _ = index_store.load_version("AAPL", updated["version"])
+    assert [chunk["sources"] for chunk in store] == [[fresh, copy]]
@@ -35,7 +35,7 @@ export async function GET(req) {
         const response = await fetch(`http://localhost:8000/build-index?ticker=${ticker}`);
         const jsonData = await response.json();  // ✅ Proper JSON response handling
 
-        return Response.json(jsonData, { status: 200 }); // ✅ Ensures JSON response is correctly formatted
+        return Response.json(jsonData, { status: response.status }); // ✅ Keeps the backend's status, e.g. 400 for an unknown ticker
     } catch (error) {
         return Response.json({ error: "Backend request failed" }, { status: 500 });
     }
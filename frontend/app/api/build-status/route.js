@@ -0,0 +1,18 @@
+export async function GET(req) {
+    const url = new URL(req.url);
+    const jobId = url.searchParams.get("job_id");
+
+    if (!jobId) {
+        return Response.json({ error: "No job id provided" }, { status: 400 });
+    }
+
+    try {
+        // Poll the Python backend for the build job's progress
+        const response = await fetch(`http://localhost:8000/build-status/${jobId}`);
+        const jsonData = await response.json();
+
+        return Response.json(jsonData, { status: response.status });
+    } catch (error) {
+        return Response.json({ error: "Backend request failed" }, { status: 500 });
+    }
+}
@@ -13,18 +13,42 @@ function LoadingComponent() {
             return;
         }
 
-        // Call backend API to build index
+        let cancelled = false;
+
+        // Poll the build job until the index is ready
+        const waitForJob = async (jobId) => {
+            while (!cancelled) {
+                const res = await fetch(`/api/build-status?job_id=${jobId}`);
+                const job = await res.json();
+                if (job.error) throw new Error(job.error);
+                if (job.status === "done") return job;
+                if (job.status === "failed") throw new Error(job.result?.error || "Index build failed");
+                await new Promise((resolve) => setTimeout(resolve, 1000));
+            }
+        };
+
+        // Call backend API to queue the index build
         fetch(`/api/build-index?ticker=${ticker}`)
             .then((res) => res.json())
+            .then((job) => {
+                // Rejected before any job was queued, e.g. an unknown ticker
+                if (job.error) throw new Error(job.error);
+                return waitForJob(job.job_id);
+            })
             .then(() => {
+                if (cancelled) return;
                 console.log("Backend request successful");
                 router.push(`/research?ticker=${ticker}`); // Redirect to research page
             })
             .catch((err) => {
                 console.error("Error:", err);
-                alert("Error processing request");
+                alert(err.message || "Error processing request");
                 router.push("/");
             });
+
+        return () => {
+            cancelled = true;
+        };
     }, [ticker, router]);
 
     return (
@@ -1,23 +1,27 @@
 import streamlit as st
-import pickle
-import time
 import os
-import requests
-import faiss
-import pandas as pd
-from datetime import datetime
-from sentence_transformers import SentenceTransformer
-from langchain_community.document_loaders import UnstructuredURLLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import sys
 from openai import OpenAI
 from dotenv import load_dotenv
 import torch
 
 torch.classes.__path__ = [os.path.join(torch.__path__[0], torch.classes.__file__)] # Fix for TorchScript error
 
+# Share the backend's process-wide helpers (model registry, caches) with the Streamlit app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+import model_registry
+import index_cache
+import index_store
+import article_cache
+import index_builder
+import retrieval
+import context_builder
+import alpha_vantage
+import prewarm
+import symbols
+
 # Load environment variables
 load_dotenv()
-ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
 OPEN_ROUTER_API_KEY = os.getenv("OPEN_ROUTER_API_KEY")
 
 st.set_page_config(page_title="FinFetch", layout="wide")
@@ -25,17 +29,21 @@ st.set_page_config(page_title="FinFetch", layout="wide")
 FAISS_DIR = "streamlit/data/"
 os.makedirs(FAISS_DIR, exist_ok=True)
 
-# Function to check if index already exists for today
-def get_faiss_filename(ticker):
-    today = datetime.today().strftime('%Y-%m-%d')
-    return os.path.join(FAISS_DIR, f"faiss_{ticker}_{today}.pkl")
+# Load the embedding model once per process; later reruns reuse it
+model_registry.warm_up()
 
-def get_chunks_filename(ticker):
-    today = datetime.today().strftime('%Y-%m-%d')
-    return os.path.join(FAISS_DIR, f"chunks_{ticker}_{today}.pkl")
+# Per-ticker indexes live in a versioned store under the Streamlit data folder
+index_store.INDEX_ROOT = os.path.join(FAISS_DIR, "indexes")
+# Alpha Vantage responses and today's call count persist across app restarts
+alpha_vantage.CACHE_FILE = os.path.join(FAISS_DIR, "alpha_vantage_cache.db")
+# Asked tickers join the watchlist that `python backend/prewarm.py --data-dir streamlit/data`
+# (e.g. from cron before market open) builds ahead of the first question of the day
+prewarm.HISTORY_FILE = os.path.join(FAISS_DIR, "query_history.db")
+prewarm.WATCHLIST_FILE = os.path.join(FAISS_DIR, "watchlist.txt")
 
+# Function to check if index already exists for today
 def is_index_cached(ticker):
-    return os.path.exists(get_faiss_filename(ticker)) and os.path.exists(get_chunks_filename(ticker))
+    return index_builder.built_today(ticker)
 
 ########################################
 # 2) Utility Functions (News, Overview)
@@ -43,105 +51,34 @@ def is_index_cached(ticker):
 
 def get_stock_news(ticker: str) -> list:
     """
-    Fetch stock news from Alpha Vantage API.
+    Fetch stock news through the backend's cached, rate-limited Alpha Vantage client.
     """
-    ticker = ticker.upper()
-    url = "https://www.alphavantage.co/query"
-    params = {
-        "function": "NEWS_SENTIMENT",
-        "tickers": ticker,
-        "apikey": ALPHA_VANTAGE_API_KEY,
-        "sort": "RELEVANCE"
-    }
-    response = requests.get(url, params=params)
-    if response.status_code != 200:
-        return {"error": "Failed to fetch data"}
-
-    data = response.json()
-    if "feed" not in data:
-        return {"error": "No news available"}
-    return data["feed"]
+    return index_builder.get_stock_news(ticker)
 
 def get_company_overview(ticker):
-    url = "https://www.alphavantage.co/query"
-    params = {"function": "OVERVIEW", "symbol": ticker, "apikey": ALPHA_VANTAGE_API_KEY}
-    response = requests.get(url, params=params)
-    data = response.json()
+    data = alpha_vantage.get_overview(ticker)
     if "Symbol" not in data:
         return f"Error fetching company overview: {data}"
-    return "\n".join([f"{key}: {val}" for key, val in data.items()])
+    # Only the useful fields, within the overview's token budget
+    return context_builder.trim_overview(data)
 
 ########################################
-# 3) Document Parsing & Splitting
+# 3) Parsing, Splitting & Embedding
 ########################################
-def parse_articles(articles: list) -> list:
-    """
-    Extract article text using LangChain's UnstructuredURLLoader.
-    """
-    urls = [article['url'] for article in articles]
-    loader = UnstructuredURLLoader(urls=urls)
-    try:
-        parsed_docs = loader.load()
-        return parsed_docs
-    except Exception as e:
-        return {"error": f"Failed to parse articles: {str(e)}"}
-
-
-def split_text(docs: list) -> list:
-    """
-    Split text into smaller chunks.
-    """
-    text_splitter = RecursiveCharacterTextSplitter(
-        separators=['\n\n', '\n', '.', ','],
-        chunk_size=1000
-    )
-
-    chunks = text_splitter.split_documents(docs)
-    processed_chunks = [
-        {
-            "text": chunk.page_content,
-            "source": chunk.metadata.get("source", "Unknown")
-        }
-        for chunk in chunks
-    ]
-    return processed_chunks
+# Article fetching, splitting and encoding are shared with the backend through
+# index_builder.prepare_chunks, which only processes articles missing from the
+# content-addressed article cache (shared across tickers and days).
+article_cache.CACHE_FILE = os.path.join(FAISS_DIR, "article_cache.db")
 
 ########################################
-# 4) Building FAISS Index
-########################################
-def build_index(processed_chunks: list):
-    """
-    Build a FAISS index from text chunks.
-    """
-    encoder = SentenceTransformer("BAAI/bge-base-en")
-    texts = [chunk["text"] for chunk in processed_chunks]
-    vectors = encoder.encode(texts)
-    faiss.normalize_L2(vectors)
-
-    dim = vectors.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(vectors)
-
-    return index
-
-########################################
-# 5) Full Pipeline to Build & Cache Index
+# 4) Full Pipeline to Build & Cache Index
 ########################################
 def build_stock_index(ticker: str):
     ticker = ticker.upper()
     
     print(ticker)
-    # Load valid stock symbols
-    LISTING_FILE = "streamlit/data/listing_status.csv"
-    valid_symbols = set()
-    if os.path.exists(LISTING_FILE):
-        df = pd.read_csv(LISTING_FILE)
-        print('Successfully read valid ticker list!')
-        if "symbol" in df.columns:
-            valid_symbols = set(df["symbol"].str.upper())
-
-    # Validate ticker
-    if ticker not in valid_symbols:
+    # Validate ticker against the listing, loaded once and reloaded only when the file changes
+    if not symbols.is_valid(ticker):
         return {"error": "Invalid ticker symbol. Please enter a valid stock ticker."}
     
     # Check if index already exists
@@ -153,75 +90,18 @@ def build_stock_index(ticker: str):
     if "error" in news:
         return news
 
-    parsed_docs = parse_articles(news)
-    if "error" in parsed_docs:
-        return parsed_docs
-
-    processed_chunks = split_text(parsed_docs)
-    if not processed_chunks:
-        return {"error": "No text available after splitting"}
-
-    # Save processed chunks
-    os.makedirs(FAISS_DIR, exist_ok=True)
-    with open(get_chunks_filename(ticker), "wb") as f:
-        pickle.dump(processed_chunks, f)
-
-    # Build and save FAISS index
-    index = build_index(processed_chunks)
-    with open(get_faiss_filename(ticker), "wb") as f:
-        pickle.dump(index, f)
-
-    return {"message": f"Index built for {ticker}", "num_vectors": len(processed_chunks)}
+    # Parse, split, embed and publish a new index version (yesterday's index is updated incrementally)
+    return index_builder.build_stock_index(ticker, news=news)
 
 ########################################
-# 6) Query LLM with Retrieval
+# 5) Query LLM with Retrieval
 ########################################
-def retrieve_relevant_chunks(index, processed_chunks, user_query, k=10):
-    encoder = SentenceTransformer("BAAI/bge-base-en")
-    query_vector = encoder.encode([user_query])
-    faiss.normalize_L2(query_vector)
-    _, indices = index.search(query_vector, k=k)
-    return [processed_chunks[i] for i in indices[0] if i < len(processed_chunks)]
-
-
 def format_retrieved_text(retrieved_docs):
-    return "\n========\n".join(
-        [f"Content: {doc['text']}\nSource: {doc['source']}" for doc in retrieved_docs]
-    )
-
-
-def query_llm_with_retrieval(ticker, user_query):
-    """Retrieves relevant news chunks and queries OpenRouter LLM."""
-    ticker = ticker.upper()
-    faiss_file = get_faiss_filename(ticker)
-    chunks_file = get_chunks_filename(ticker)
-
-    # Check if the index exists
-    if not os.path.exists(faiss_file) or not os.path.exists(chunks_file):
-        return {"error": f"No index found for {ticker} today. Please build the index first."}
-
-    # Load FAISS Index
-    with open(faiss_file, "rb") as f:
-        index = pickle.load(f)
-
-    # Load Processed Chunks
-    with open(chunks_file, "rb") as f:
-        processed_chunks = pickle.load(f)
+    return "\n========\n".join([context_builder.format_chunk(doc) for doc in retrieved_docs])
 
-    # Retrieve top-k relevant documents
-    retrieved_docs = retrieve_relevant_chunks(index, processed_chunks, user_query, k=10)
 
-    # Format retrieved docs
-    retrieved_text = format_retrieved_text(retrieved_docs)
-
-    # Load Company Overview
-    company_overview = get_company_overview(ticker)
-
-    # OpenRouter API client
-    client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=OPEN_ROUTER_API_KEY)
-
-    # Construct prompt
-    messages = [
+def make_messages(company_overview, retrieved_text, user_query):
+    return [
         {
             "role": "system",
             "content": (
@@ -259,46 +139,69 @@ def query_llm_with_retrieval(ticker, user_query):
         }
     ]
 
-    # Call LLM
-    completion = client.chat.completions.create(
+
+def stream_llm_with_retrieval(ticker, user_query):
+    """Retrieves relevant news chunks and yields the OpenRouter LLM answer token by token as it is generated."""
+    ticker = ticker.upper()
+    # Check if the index exists and pin its current version
+    version = index_store.current_version(ticker)
+    if version is None:
+        yield f"No index found for {ticker} today. Please build the index first."
+        return
+
+    # Load FAISS index, processed chunks and BM25 index, reusing the in-memory copy of this version
+    def load_index_files():
+        index, processed_chunks, _ = index_store.load_version(ticker, version)
+        return index, processed_chunks, index_store.load_lexical(ticker, version)
+
+    index, processed_chunks, lexical = index_cache.get_or_load(ticker, version, load_index_files)
+
+    # Retrieve candidates, then keep diverse chunks that fit the prompt's news budget
+    ids = retrieval.search(index, lexical, user_query, context_builder.CANDIDATE_CHUNKS)
+    template_tokens = sum(context_builder.count_tokens(m["content"]) for m in make_messages("", "", ""))
+    budget = context_builder.news_budget(user_query, template_tokens)
+    retrieved_docs = context_builder.select_chunks(index, processed_chunks, ids, budget)
+
+    # Format retrieved docs
+    retrieved_text = format_retrieved_text(retrieved_docs)
+
+    # Load Company Overview
+    company_overview = get_company_overview(ticker)
+
+    # OpenRouter API client
+    client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=OPEN_ROUTER_API_KEY)
+
+    # Construct prompt
+    messages = make_messages(company_overview, retrieved_text, user_query)
+    context_builder.report(ticker, messages, {"overview": company_overview, "news": retrieved_text, "question": user_query})
+
+    # Call LLM and forward tokens as they arrive
+    stream = client.chat.completions.create(
         model="meta-llama/llama-3.3-70b-instruct:free",
-        messages=messages
+        messages=messages,
+        stream=True
     )
-
-    return completion.choices[0].message.content
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
 
 ########################################
-# 7) Streamlit UI
+# 6) Streamlit UI
 ########################################
 
-def response_generator(text: str, delay: float = 0.05):
-    """
-    Yields chunks of text while preserving newlines and spacing,
-    sleeping 'delay' seconds between each chunk.
-    """
-    buffer = ""
-    i = 0
-    while i < len(text):
-        char = text[i]
-        buffer += char
-        
-        # Yield when we hit a space, newline, or end of text
-        if char in [' ', '\n'] or i == len(text) - 1:
-            yield buffer
-            buffer = ""
-            time.sleep(delay)
-        i += 1
-    
-    # Ensure any remaining buffer is yielded
-    if buffer:
-        yield buffer
-
 # Sidebar settings
 with st.sidebar:
     st.image("streamlit/FinFetch Logo.png", width=80)
     st.header("Build Index")
 
-    ticker = st.text_input("Enter Stock Ticker:")
+    query = st.text_input("Enter Stock Ticker or Company Name:")
+    ticker = query.strip().upper()
+
+    # Suggest listed tickers and companies matching what was typed
+    suggestions = symbols.complete(query) if query else []
+    if suggestions and suggestions[0]["symbol"] != ticker:
+        choice = st.selectbox("Matching companies:", suggestions, format_func=lambda s: f"{s['symbol']} — {s['name']}")
+        ticker = choice["symbol"]
 
     # Display current ticker at the bottom
 
@@ -308,7 +211,8 @@ with st.sidebar:
     if not ticker:
         st.write("**Current Company:** None")
     if ticker:
-        st.write(f"**Current Company:** {ticker}")
+        listing = symbols.lookup(ticker)
+        st.write(f"**Current Company:** {ticker}" + (f" ({listing['name']})" if listing else ""))
 
     if st.button("Submit"):
         with st.spinner("Fetching stock news and building index..."):
@@ -317,6 +221,8 @@ with st.sidebar:
                 st.error(response["error"])
             else:
                 st.success(response["message"])
+                if response.get("skipped_urls"):
+                    st.warning(f"Skipped {len(response['skipped_urls'])} article(s) that could not be fetched.")
 
     
 
@@ -350,27 +256,21 @@ for msg in st.session_state.messages:
 # User query input
 if user_query := st.chat_input("Ask a financial question..."):
     ticker = ticker.upper()
-    faiss_file = get_faiss_filename(ticker)
-    chunks_file = get_chunks_filename(ticker)
-
     # Validate if the FAISS index exists for the given ticker and today's date
-    if not os.path.exists(faiss_file) or not os.path.exists(chunks_file):
+    if not is_index_cached(ticker):
         st.error(f"No index found for {ticker} today. Please build the index first.")
     else:
         # 1) Add user message to conversation & display
         st.session_state.messages.append({"role": "user", "content": user_query})
         st.chat_message("user").write(user_query)
+        prewarm.record_query([ticker])
 
         with st.spinner("Generating answer..."):
-            # 2) Retrieve entire answer from your LLM or RAG pipeline
-            full_answer = query_llm_with_retrieval(ticker, user_query)
-            print(full_answer)
-
-            # 3) Stream it word by word using a generator
+            # 2) Stream the answer from the RAG pipeline as the LLM generates it
             with st.chat_message("assistant"):
-                streamed_text = st.write_stream(response_generator(full_answer))
+                streamed_text = st.write_stream(stream_llm_with_retrieval(ticker, user_query))
                 # 'streamed_text' is the final string returned by write_stream,
                 # which accumulates all tokens from the generator.
 
-            # 4) Add assistant message to conversation
+            # 3) Add assistant message to conversation
             st.session_state.messages.append({"role": "assistant", "content": streamed_text})